@@ -4,18 +4,74 @@ class Settings(BaseSettings):
     # Mongo
     MONGO_URI: str
     DB_NAME: str
+    mongo_ensure_indexes: bool = True   # create the app/indexes.py index set on startup
 
     # Azure LLM
     AZURE_OPENAI_LLM_KEY: str
     AZURE_LLM_API_VERSION: str
     AZURE_LLM_ENDPOINT: str
     AZURE_LLM_DEPLOYMENT_41_MINI: str
+    llm_max_connections: int = 20              # pooled HTTP connections to Azure, per process
+    llm_max_keepalive_connections: int = 10    # idle connections kept warm in the pool
+    llm_keepalive_expiry_sec: float = 30.0     # idle connection lifetime before it is closed
+    llm_json_mode: bool = True                 # response_format=json_object for JSON-returning prompts
+    llm_max_concurrency: int = 8               # Azure calls in flight per process; more wait in the fair queue
+    llm_token_budget: int = 40000              # estimated tokens (prompt + completion) in flight per process
+    llm_expected_output_tokens: int = 800      # completion allowance added to each prompt's estimate
+    llm_weight_interactive: float = 4.0        # fair-queue share of calls a user is waiting on...
+    llm_weight_batch: float = 1.0              # ...relative to generate_all, batches and prefetch
+    # LLM resilience
+    AZURE_LLM_DEPLOYMENT_SECONDARY: str = ""   # optional fallback / hedge deployment on the same endpoint
+    llm_deadline_sec: float = 60.0             # whole call incl. retries and failover — 504 after this
+    llm_attempt_timeout_sec: float = 30.0      # one HTTP attempt (the client's own timeout)
+    llm_max_retries: int = 3                   # retries per deployment on 429 / 5xx / timeouts
+    llm_backoff_base_sec: float = 0.5          # full-jitter exponential back-off when no retry-after is sent
+    llm_backoff_max_sec: float = 8.0
+    llm_breaker_failures: int = 5              # consecutive 5xx / timeouts that open a deployment's circuit
+    llm_breaker_reset_sec: float = 30.0        # open circuit fails fast this long, then lets one probe through
+    llm_hedge_after_sec: float = 0.0           # >0: also ask the secondary if the primary is this slow; 0 disables
+    # LLM routing — task → deployment / secondary / temperature / max_tokens / timeout_sec (JSON in LLM_ROUTES).
+    # Fields left out use the defaults above; templates override per task in generation_rules.model_routing.
+    llm_routes: dict[str, dict] = {
+        "questions":       {"max_tokens": 800,  "timeout_sec": 30.0},
+        "questions_batch": {"max_tokens": 3000, "timeout_sec": 60.0},
+        "section":         {"max_tokens": 3000, "timeout_sec": 60.0},
+        "enhance":         {"max_tokens": 3000, "timeout_sec": 60.0},
+    }
     # Notion
     notion_api_key: str = ""
     notion_database_id: str = ""
+    notion_rate_per_sec: float = 3.0    # Notion's per-integration average, shared by all workers
+    notion_rate_burst: int = 3
+    notion_max_connections: int = 5         # pooled keep-alive connections to api.notion.com
+    notion_keepalive_expiry_sec: float = 60.0
+    notion_mirror_refresh_sec: float = 300.0     # incremental library sync interval; 0 disables the loop
+    notion_mirror_full_sync_sec: float = 86400.0 # full pass that also drops archived pages
     
     # Redis
     redis_url: str = "redis://localhost:6379/0"
+    l1_cache_ttl_sec: float = 60.0        # per-process copy of departments/templates
+    l1_cache_max_entries: int = 256
+    template_cache_ttl_sec: float = 3600.0   # parsed template documents, revalidated by version on every use
+    template_cache_max_entries: int = 128
+    llm_cache_ttl_sec: int = 86400        # cached LLM responses expire after a day
+    llm_cache_max_entries: int = 5000     # least recently used responses are evicted past this
+
+    # Generation
+    generate_all_concurrency: int = 4   # max sections written in parallel by /generate_all
+    question_prefetch_sections: int = 2 # upcoming sections whose questions are generated in the background; 0 disables
+    question_batch_size: int = 5        # sections per batched question-generation call
+
+    # PDF rendering (process pool)
+    pdf_workers: int = 2                # render processes per API process
+    pdf_max_queue: int = 8              # renders allowed to wait for a process before 503
+    pdf_render_timeout_sec: float = 60.0
+    pdf_max_pages: int = 300
+    pdf_gc_grace_sec: int = 600         # superseded PDFs are kept this long for downloads still streaming them
+
+    # Background jobs
+    job_workers: int = 2                # concurrent background jobs (e.g. Notion publishes) per process
+    job_stale_sec: int = 120            # queued/running jobs not touched for this long are failed as orphaned
     class Config:
         env_file = ".env"
 
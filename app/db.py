@@ -1,8 +1,15 @@
-from pymongo import MongoClient
+from pymongo import AsyncMongoClient, MongoClient
 from app.config import MONGO_URI, DB_NAME
 
 client = MongoClient(MONGO_URI)
 db = client[DB_NAME]
 
+# Async handle for `async def` routes — never blocks the event loop on Mongo I/O
+async_client = AsyncMongoClient(MONGO_URI)
+async_db = async_client[DB_NAME]
+
 def get_db():
     return db
+
+def get_async_db():
+    return async_db
@@ -1,9 +1,14 @@
 import streamlit as st
 import requests
+import json
+import time
 from datetime import datetime
 import markdown as md_lib
 
 API_BASE = "http://localhost:8000"
+STREAM_REDRAW_SEC = 0.1   # redraw the preview at most this often while a section streams in
+JOB_MAX_WAIT_SEC  = 900   # give up polling a background job after this long
+JOB_STALE_SEC     = 180   # ...or once it has not changed for this long (API restarted mid-job)
 
 st.set_page_config(
     page_title="DocForge",
@@ -414,9 +419,58 @@ def api(method, path, **kwargs):
     except requests.exceptions.HTTPError as e:
         try:    d = e.response.json().get("detail", str(e))
         except: d = str(e)
+        if isinstance(d, dict): d = d.get("message", str(d))
         return None, d
     except Exception as e: return None, str(e)
 
+def api_stream(path, on_event, **kwargs):
+    """Consume a Server-Sent Events endpoint, calling on_event(event, data) per message."""
+    try:
+        with requests.get(f"{API_BASE}{path}", stream=True, timeout=(5, 90), **kwargs) as r:
+            r.raise_for_status()
+            st.session_state.api_ok = True
+            event = "message"
+            for line in r.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:"):
+                    on_event(event, json.loads(line[5:])); event = "message"
+        return None
+    except requests.exceptions.ConnectionError:
+        st.session_state.api_ok = False
+        return "Cannot connect — run: `uvicorn app.main:app --reload`"
+    except requests.exceptions.HTTPError as e:
+        try:    return e.response.json().get("detail", str(e))
+        except: return str(e)
+    except Exception as e: return str(e)
+
+def run_job(path, label, **kwargs):
+    """POST to an endpoint that queues a background job, then poll /jobs/{id} until it finishes."""
+    data, err = api("post", path, **kwargs)
+    if err: return None, err
+    job_id = data["job_id"]
+    bar = st.progress(0.0, text=label)
+    started = changed = time.monotonic(); last = None
+    while True:
+        job, err = api("get", f"/jobs/{job_id}")
+        if err: bar.empty(); return None, err
+        # Heartbeats move updated_at while the job is alive — a frozen job means its API process died
+        seen = (job["status"], job.get("updated_at"), json.dumps(job.get("progress"), sort_keys=True))
+        now  = time.monotonic()
+        if seen != last: last, changed = seen, now
+        if now - changed > JOB_STALE_SEC:
+            bar.empty(); return None, f"Job {job_id} stopped responding — the API may have restarted. Try again."
+        if now - started > JOB_MAX_WAIT_SEC:
+            bar.empty(); return None, f"Job {job_id} is still {job['status']} after {JOB_MAX_WAIT_SEC // 60} min — check /jobs/{job_id} later."
+        prog  = job.get("progress") or {}
+        total = prog.get("blocks_total") or 0
+        if total:
+            sent = prog.get("blocks_sent", 0)
+            bar.progress(min(sent / total, 1.0), text=f"{label} {sent}/{total} blocks")
+        if job["status"] == "succeeded": bar.empty(); return job["result"], None
+        if job["status"] == "failed":    bar.empty(); return None, job.get("error") or "Job failed"
+        time.sleep(1)
+
 def ping():
     try:
         r = requests.get(f"{API_BASE}/docs", timeout=3)
@@ -629,8 +683,7 @@ def page_view_doc():
         )
     else:
         if st.button("📤  Publish to Notion", key="btn_notion_view", type="secondary"):
-            with st.spinner("Publishing to Notion..."):
-                data, err = api("post", f"/sessions/{sess}/publish_notion",
+            data, err = run_job(f"/sessions/{sess}/publish_notion", "Publishing to Notion...",
                                 json={"doc_title": doc["doc_name"]})
             if err: st.error(err)
             else: st.session_state[f"notion_result_{sess}"] = data; st.rerun()
@@ -714,7 +767,8 @@ def page_context():
             "key_problem_solved":key_problem.strip(),
         }
         with st.spinner("Creating session..."):
-            data, err = api("post", "/sessions/", json={"template_id":st.session_state.template_id})
+            data, err = api("post", "/sessions/", json={"template_id":st.session_state.template_id,
+                                                        "company_context":st.session_state.company_context})
         if err: st.error(err); return
         st.session_state.session_id=data["session_id"]; st.session_state.total_sections=data["total_sections"]
         add_to_history(data["session_id"], st.session_state.template_name, st.session_state.dept_name)
@@ -742,15 +796,17 @@ def page_generating():
         st.session_state.questions=data.get("questions",[]); st.session_state.need_questions=False; st.rerun()
 
     left, right = st.columns([9,11], gap="large")
+    # Reserve the preview slot first so section streaming can draw into it
+    with right: preview_slot = st.empty()
     with left:
         if st.session_state.all_done: _done_left()
         elif not st.session_state.questions:
             st.markdown('<div class="ld-row"><span class="ld"></span><span class="ld"></span><span class="ld"></span><span>Generating questions...</span></div>', unsafe_allow_html=True)
         elif st.session_state.generated_content is not None: _approve_panel()
-        else: _questions_form()
-    with right: _preview_panel()
+        else: _questions_form(preview_slot)
+    preview_slot.markdown(_preview_html(), unsafe_allow_html=True)
 
-def _questions_form():
+def _questions_form(preview_slot):
     sess=st.session_state.session_id; section=st.session_state.current_section
     sec_id=section["id"]; idx=st.session_state.current_index; total=st.session_state.total_sections
     pct=int((idx/total)*100) if total else 0
@@ -775,11 +831,23 @@ def _questions_form():
         with st.spinner("Saving answers..."):
             _, err = api("post", f"/sessions/{sess}/submit_answers", json={"section_id":sec_id,"answers":payload})
         if err: st.error(err); return
-        with st.spinner("Writing section with AI..."):
-            data, err = api("post", f"/sessions/{sess}/generate_section",
-                            json={"section_id":sec_id,"company_context":st.session_state.company_context})
+        title  = section.get("title",sec_id)
+        result = {"content":"","error":None,"drawn_at":0.0}
+        def on_event(event, data):
+            if event == "token":
+                result["content"] += data.get("delta","")
+                # Re-rendering the whole preview per token is O(n²) and flickers — redraw on a timer
+                now = time.monotonic()
+                if now - result["drawn_at"] >= STREAM_REDRAW_SEC:
+                    result["drawn_at"] = now
+                    preview_slot.markdown(_preview_html(streaming=(title, result["content"])), unsafe_allow_html=True)
+            elif event == "done":  result["content"] = data.get("content","")
+            elif event == "error": result["error"] = data.get("detail","Generation failed")
+        err = api_stream(f"/sessions/{sess}/generate_section/stream", on_event,
+                         params={"section_id":sec_id,"company_context":json.dumps(st.session_state.company_context or {})})
+        err = err or result["error"]
         if err: st.error(err); return
-        content=data.get("content",""); st.session_state.generated_content=content; st.session_state.edited_content=content
+        content=result["content"]; st.session_state.generated_content=content; st.session_state.edited_content=content
         upsert_preview(sec_id, section.get("title",sec_id), content, "generated"); st.rerun()
 
 def _approve_panel():
@@ -986,12 +1054,22 @@ def _done_left():
                 f'</div>',
                 unsafe_allow_html=True
             )
-            if st.button("📤 Publish again", use_container_width=True, key="btn_notion_again", type="secondary"):
-                st.session_state.notion_result = None; st.rerun()
+            upd_col, again_col = st.columns(2)
+            with upd_col:
+                # Patches only the changed blocks of the same Notion page
+                if st.button("🔄 Update in Notion", use_container_width=True, key="btn_notion_update", type="secondary"):
+                    data, err = run_job(f"/sessions/{sess}/publish_notion", "Updating Notion page...",
+                                        json={"doc_title": st.session_state.template_name, "mode": "update"})
+                    if err: st.error(err)
+                    else:
+                        st.session_state.notion_result = data; st.rerun()
+            with again_col:
+                # A new page (next version) instead of patching the last one
+                if st.button("📤 Publish again", use_container_width=True, key="btn_notion_again", type="secondary"):
+                    st.session_state.notion_result = None; st.rerun()
         else:
             if st.button("📤  Publish to Notion", use_container_width=True, key="btn_notion", type="secondary"):
-                with st.spinner("Publishing to Notion..."):
-                    data, err = api("post", f"/sessions/{sess}/publish_notion",
+                data, err = run_job(f"/sessions/{sess}/publish_notion", "Publishing to Notion...",
                                     json={"doc_title": st.session_state.template_name})
                 if err: st.error(err)
                 else:
@@ -1005,10 +1083,11 @@ def render_markdown(text: str) -> str:
     """Convert markdown to HTML for safe rendering in preview."""
     return md_lib.markdown(text, extensions=["tables", "nl2br", "sane_lists"])
 
-def _preview_panel():
+def _preview_html(streaming=None):
     # Build 100% of preview content as a single HTML string in one st.markdown call.
     # This is the ONLY way to guarantee content renders inside the container —
     # any separate st.markdown() calls get injected outside by Streamlit's renderer.
+    # streaming: optional (title, partial_content) for a section still being written.
     inner = ""
 
     if st.session_state.compiled_content:
@@ -1029,26 +1108,35 @@ def _preview_panel():
                       f'</div>'
                       f'<div class="psec-body">{render_markdown(s.get("content",""))}</div>'
                       f'</div>')
-    else:
+
+    if streaming and not st.session_state.compiled_content:
+        title, partial = streaming
+        inner += (f'<div class="psec">'
+                  f'<div class="psec-hdr">'
+                  f'<div class="psec-name">{title}</div><span class="chip chip-g">● writing…</span>'
+                  f'</div>'
+                  f'<div class="psec-body">{render_markdown(partial)}</div>'
+                  f'</div>')
+    elif not inner:
         inner = ('<div class="preview-empty">'
                  '<div class="preview-empty-icon">📝</div>'
                  '<div class="preview-empty-txt">Approved sections will appear here</div>'
                  '</div>')
 
-    # Single call — everything inside one coherent HTML block
-    st.markdown(
-        f'<div class="preview-outer">'
-        f'  <div class="preview-hdr">'
-        f'    <div class="preview-hdr-lbl">📄 Document Preview</div>'
-        f'  </div>'
-        f'  <div class="preview-body">{inner}</div>'
-        f'</div>',
-        unsafe_allow_html=True
-    )
+    # Single string — everything inside one coherent HTML block
+    return (f'<div class="preview-outer">'
+            f'  <div class="preview-hdr">'
+            f'    <div class="preview-hdr-lbl">📄 Document Preview</div>'
+            f'  </div>'
+            f'  <div class="preview-body">{inner}</div>'
+            f'</div>')
 
 # ─────────────────────────────────────────────────────────────
+def _lib_reset_page():
+    st.session_state.lib_page = 1
+
 def page_notion_library():
-    """Fetch all published docs from Notion DB and display them."""
+    """List published docs from the API's Notion library mirror, filtered and paged."""
 
     # ── Header ────────────────────────────────────────────────
     c_back, c_title = st.columns([1, 8])
@@ -1063,9 +1151,23 @@ def page_notion_library():
                 'All documents published to Notion from DocForge.</div>',
                 unsafe_allow_html=True)
 
-    # ── Fetch from Notion DB via API ──────────────────────────
-    with st.spinner("Fetching from Notion..."):
-        data, err = api("get", "/notion/library")
+    # ── Filters (any change goes back to page 1) ──────────────
+    opts, _ = api("get", "/notion/library/filters")
+    opts = opts or {}
+    f1, f2, f3, f4 = st.columns([3, 2, 2, 2])
+    with f1: search   = st.text_input("Search", placeholder="Title contains...", key="lib_q", on_change=_lib_reset_page)
+    with f2: industry = st.selectbox("Industry", ["All"] + opts.get("industries", []), key="lib_industry", on_change=_lib_reset_page)
+    with f3: tag      = st.selectbox("Tag", ["All"] + opts.get("tags", []), key="lib_tag", on_change=_lib_reset_page)
+    with f4: version  = st.selectbox("Version", ["All"] + opts.get("versions", []), key="lib_version", on_change=_lib_reset_page)
+
+    params = {"page": st.session_state.get("lib_page", 1), "page_size": 20}
+    if search:             params["q"]        = search
+    if industry != "All":  params["industry"] = industry
+    if tag != "All":       params["tags"]     = tag
+    if version != "All":   params["version"]  = version
+
+    # ── Fetch from the library mirror via API ─────────────────
+    data, err = api("get", "/notion/library", params=params)
 
     if err:
         st.error(f"Could not fetch Notion library: {err}")
@@ -1074,9 +1176,14 @@ def page_notion_library():
     docs = data.get("docs", [])
     if not docs:
         st.markdown('<div style="text-align:center;padding:3rem;color:#9ca3af;">'
-                    '📭 No documents published yet.</div>', unsafe_allow_html=True)
+                    '📭 No documents found.</div>', unsafe_allow_html=True)
         return
 
+    synced = (data.get("synced_at") or "")[:16].replace("T", " ")
+    st.markdown(f'<div style="color:#9ca3af;font-size:0.75rem;margin-bottom:0.6rem">'
+                f'{data.get("total", len(docs))} documents'
+                f'{f" · synced {synced} UTC" if synced else ""}</div>', unsafe_allow_html=True)
+
     # ── Render doc cards ──────────────────────────────────────
     for doc in docs:
         title    = doc.get("title", "Untitled")
@@ -1104,6 +1211,19 @@ def page_notion_library():
                 st.markdown("---")
                 st.markdown(content, unsafe_allow_html=False)
 
+    # ── Pagination ────────────────────────────────────────────
+    page = data.get("page", 1)
+    p_prev, p_lbl, p_next = st.columns([1, 6, 1])
+    with p_prev:
+        if page > 1 and st.button("← Prev", key="lib_prev", type="secondary"):
+            st.session_state.lib_page = page - 1; st.rerun()
+    with p_lbl:
+        st.markdown(f'<div style="text-align:center;color:#6b7280;font-size:0.8rem;padding-top:0.4rem">'
+                    f'Page {page}</div>', unsafe_allow_html=True)
+    with p_next:
+        if data.get("has_more") and st.button("Next →", key="lib_next", type="secondary"):
+            st.session_state.lib_page = page + 1; st.rerun()
+
 
 # ─────────────────────────────────────────────────────────────
 if st.session_state.page == "home":             page_home()
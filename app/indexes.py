@@ -0,0 +1,147 @@
+"""
+MongoDB index set for DocForge.
+
+The indexes every hot query relies on live here, in code, and are created
+idempotently at API startup. Run as a script to compare the database with
+this spec:
+
+    python -m app.indexes            # report missing / extra / unused indexes
+    python -m app.indexes --apply    # create anything missing, then report
+"""
+import argparse
+import logging
+import sys
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger("docforge.indexes")
+
+# collection -> indexes. Unique where routes upsert on the key and assume one doc.
+INDEXES: dict[str, list[IndexModel]] = {
+    "session_questions": [
+        IndexModel([("session_id", ASCENDING), ("section_id", ASCENDING)],
+                   name="session_section_unique", unique=True),
+    ],
+    "doc_sections": [
+        IndexModel([("session_id", ASCENDING), ("section_id", ASCENDING)],
+                   name="session_section_unique", unique=True),
+        IndexModel([("session_id", ASCENDING), ("status", ASCENDING)],
+                   name="session_status"),
+    ],
+    "generated_documents": [
+        IndexModel([("session_id", ASCENDING)], name="session_unique", unique=True),
+    ],
+    "notion_publishes": [
+        IndexModel([("session_id", ASCENDING), ("published_at", DESCENDING)],
+                   name="session_published_at"),
+    ],
+    "notion_library": [
+        IndexModel([("created_time", DESCENDING)], name="created_time"),
+        IndexModel([("industry", ASCENDING), ("created_time", DESCENDING)], name="industry_created_time"),
+        IndexModel([("tag_list", ASCENDING)], name="tag_list"),
+        IndexModel([("version", ASCENDING)], name="version"),
+    ],
+    "document_templates": [
+        IndexModel([("dept_id", ASCENDING)], name="dept_id"),
+    ],
+}
+
+
+# "collection.index" -> error, from the last ensure_indexes() run — shown by the health check
+index_failures: dict[str, str] = {}
+
+
+def _key_of(spec) -> tuple:
+    """
+    Normalise an index key (IndexModel document or index_information entry) for comparison.
+    Directions are kept as-is — "text", "2dsphere" and "hashed" are not numbers (1 == 1.0 still holds).
+    """
+    return tuple((field, direction) for field, direction in spec)
+
+
+def ensure_indexes(db) -> dict:
+    """
+    Create every index in INDEXES that does not exist yet.
+
+    Safe to run on every startup — create_indexes is a no-op for indexes that
+    already match. Indexes are built one at a time, so a failure (e.g.
+    duplicate data blocking a unique index) does not stop the others; every
+    failure is logged as an error and kept in `index_failures`.
+    """
+    result = {}
+    index_failures.clear()
+    for collection, models in INDEXES.items():
+        created = []
+        for model in models:
+            name = model.document["name"]
+            try:
+                created += db[collection].create_indexes([model])
+            except OperationFailure as e:
+                if model.document.get("unique") and e.code == 11000:
+                    logger.error(
+                        f"Unique index {collection}.{name} NOT built — duplicate data in {collection}; "
+                        f"routes that assume one document per key may misbehave. Remove the duplicates "
+                        f"and run `python -m app.indexes --apply`: {e}"
+                    )
+                else:
+                    logger.error(f"Index {collection}.{name} creation failed: {e}")
+                index_failures[f"{collection}.{name}"] = str(e)
+        result[collection] = created
+    if index_failures:
+        logger.error(f"MongoDB indexes incomplete — {len(index_failures)} failed: {', '.join(index_failures)}")
+    else:
+        logger.info("MongoDB indexes ensured ✓")
+    return result
+
+
+def index_report(db) -> dict:
+    """Per collection: indexes in spec but not in the DB, in the DB but not in spec, and never used."""
+    report = {}
+    for collection, models in INDEXES.items():
+        coll     = db[collection]
+        existing = {
+            name: _key_of(info["key"])
+            for name, info in coll.index_information().items()
+            if name != "_id_"
+        }
+        expected = {_key_of(m.document["key"].items()): m.document["name"] for m in models}
+
+        try:
+            usage = {s["name"]: s["accesses"]["ops"] for s in coll.aggregate([{"$indexStats": {}}])}
+        except OperationFailure:
+            usage = {}  # $indexStats needs clusterMonitor — report without usage
+
+        report[collection] = {
+            "missing": [name for key, name in expected.items() if key not in existing.values()],
+            "extra":   [name for name, key in existing.items() if key not in expected],
+            "unused":  [name for name in existing if usage.get(name) == 0],
+            "usage":   usage,
+        }
+    return report
+
+
+def main() -> None:
+    from app.db import get_db
+
+    parser = argparse.ArgumentParser(description="Report or apply DocForge MongoDB indexes.")
+    parser.add_argument("--apply", action="store_true", help="create missing indexes before reporting")
+    args = parser.parse_args()
+
+    db = get_db()
+    if args.apply:
+        ensure_indexes(db)
+
+    for collection, info in index_report(db).items():
+        print(f"{collection}")
+        print(f"  missing: {', '.join(info['missing']) or '-'}")
+        print(f"  extra:   {', '.join(info['extra']) or '-'}")
+        print(f"  unused:  {', '.join(info['unused']) or '-'}  (ops since last restart)")
+    if index_failures:
+        print(f"failed:    {', '.join(index_failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+    main()
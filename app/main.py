@@ -1,5 +1,6 @@
 import logging
 import traceback
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request, status
 from fastapi.responses import JSONResponse
@@ -11,6 +12,17 @@ from app.routes.templates import router as templates_router
 from app.routes.sessions import router as sessions_router
 from app.routes.cache_routes import router as cache_router
 from app.routes.notion_library import router as notion_library_router
+from app.routes.jobs import router as jobs_router
+from app.routes.llm_routes import router as llm_router
+from app.config import settings
+from app.db import async_client, get_db
+from app.indexes import ensure_indexes, index_failures
+from app.redis_client import start_invalidation_listener, stop_invalidation_listener
+from app.services.llm_provider import llm_registry
+from app.services.job_queue import job_queue
+from app.services.notion_client import notion_client
+from app.services.notion_mirror import notion_mirror
+from app.services.pdf_renderer import pdf_renderer
 
 logging.basicConfig(
     level=logging.INFO,
@@ -18,13 +30,43 @@ logging.basicConfig(
 )
 logger = logging.getLogger("docforge")
 
-app = FastAPI(title="DocForge")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.mongo_ensure_indexes:
+        try:
+            ensure_indexes(get_db())
+        except Exception as e:
+            logger.warning(f"Could not ensure MongoDB indexes: {e}")
+    # One pooled LLM client per process — shared by every request
+    llm_registry.startup()
+    # Clears the in-process departments/templates cache when /cache/bust runs on any worker
+    start_invalidation_listener()
+    # Keep-alive Notion connection + background workers for queued jobs (Notion publishing)
+    notion_client.start()
+    job_queue.start()
+    # Keeps the Mongo copy of the Notion library fresh — /notion/library reads only the copy
+    notion_mirror.start()
+    # PDF layout runs in worker processes, off the event loop
+    pdf_renderer.start()
+    yield
+    pdf_renderer.stop()
+    await notion_mirror.stop()
+    await job_queue.stop()
+    await notion_client.close()
+    stop_invalidation_listener()
+    await llm_registry.shutdown()
+    await async_client.close()
+
+
+app = FastAPI(title="DocForge", lifespan=lifespan)
 
 app.include_router(dept_router)
 app.include_router(templates_router)
 app.include_router(sessions_router)
 app.include_router(cache_router)
 app.include_router(notion_library_router)
+app.include_router(jobs_router)
+app.include_router(llm_router)
 
 # ── 422 Wrong request body / missing fields ──────────────────
 @app.exception_handler(RequestValidationError)
@@ -56,6 +98,7 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
                 "error":  f"HTTP {exc.status_code}",
                 "detail": exc.detail,
             },
+            headers=getattr(exc, "headers", None),
         )
     except Exception as e:
         logger.error("Error in HTTP handler: %s", str(e))
@@ -88,6 +131,9 @@ async def unhandled_exception_handler(request: Request, exc: Exception):
 @app.get("/")
 def health():
     try:
+        if index_failures:
+            # A missing unique index lets duplicates in — make it visible, not just a startup log line
+            return {"status": "degraded", "index_failures": index_failures}
         return {"status": "running"}
     except Exception as e:
         logger.error("Health check failed: %s", str(e))
@@ -1,11 +1,19 @@
 import redis
 import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
 from app.config import settings
 
 logger = logging.getLogger("docforge.redis")
 
 CACHE_TTL = 3600  # 1 hour — departments and templates rarely change
 
+# Cached data lives under "docforge:" and is wiped by /cache/bust. Shared state that
+# must survive a bust (rate limiter, locks, counters) goes under STATE_PREFIX instead.
+STATE_PREFIX = "docforge-state:"
+
 try:
     _redis = redis.Redis.from_url(
         settings.redis_url,
@@ -21,4 +29,111 @@ except Exception as e:
 
 
 def get_redis():
-    return _redis
\ No newline at end of file
+    return _redis
+
+
+# ─── In-process L1 cache ──────────────────────────────────────
+INVALIDATE_CHANNEL = "docforge:cache:invalidate"
+
+
+class LocalCache:
+    """
+    Small per-process TTL + LRU cache that sits in front of Redis.
+
+    Hits skip the Redis round trip and the json.loads. Entries live for at
+    most `ttl` seconds and the least recently used one is dropped once
+    `maxsize` is reached. Every worker clears its copy when a message is
+    published on INVALIDATE_CHANNEL (see /cache/bust).
+    """
+
+    _instances: "weakref.WeakSet[LocalCache]" = weakref.WeakSet()
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl     = ttl
+        self._data: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self._lock   = threading.Lock()
+        LocalCache._instances.add(self)
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+def clear_local_caches() -> None:
+    """Clear every LocalCache in this process (departments/templates L1, template documents)."""
+    for cache in list(LocalCache._instances):
+        cache.clear()
+
+
+l1_cache = LocalCache(maxsize=settings.l1_cache_max_entries, ttl=settings.l1_cache_ttl_sec)
+
+_listener_stop = threading.Event()
+_listener_thread: threading.Thread | None = None
+
+
+def publish_invalidation() -> int:
+    """Tell every worker to drop its local caches. Returns how many subscribers got it."""
+    clear_local_caches()
+    if not _redis:
+        return 0
+    return _redis.publish(INVALIDATE_CHANNEL, "bust")
+
+
+def _listen_for_invalidation() -> None:
+    while not _listener_stop.is_set():
+        try:
+            pubsub = _redis.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATE_CHANNEL)
+            while not _listener_stop.is_set():
+                if pubsub.get_message(timeout=1.0):
+                    clear_local_caches()
+                    logger.info("Local caches cleared by invalidation message")
+            pubsub.close()
+        except Exception as e:
+            # Missed messages while reconnecting are bounded by the local cache TTLs
+            clear_local_caches()
+            logger.warning(f"L1 invalidation listener error — retrying: {e}")
+            _listener_stop.wait(2)
+
+
+def start_invalidation_listener() -> None:
+    global _listener_thread
+    if not _redis or _listener_thread is not None:
+        return
+    _listener_stop.clear()
+    _listener_thread = threading.Thread(
+        target=_listen_for_invalidation, name="docforge-l1-invalidation", daemon=True
+    )
+    _listener_thread.start()
+
+
+def stop_invalidation_listener() -> None:
+    global _listener_thread
+    _listener_stop.set()
+    if _listener_thread is not None:
+        _listener_thread.join(timeout=3)
+    _listener_thread = None
@@ -1,39 +1,126 @@
 import logging
-from fastapi import APIRouter
-from app.redis_client import get_redis
+from collections import defaultdict
+from fastapi import APIRouter, Query
+from app.redis_client import get_redis, clear_local_caches, publish_invalidation
+from app.services.llm_cache import llm_cache
+from app.services.llm_usage import llm_usage
 
 logger = logging.getLogger("docforge.cache")
 router = APIRouter(prefix="/cache", tags=["Cache"])
 
+KEY_PATTERN  = "docforge:*"
+SCAN_COUNT   = 500   # keys per SCAN step — small enough to never stall a shared Redis
+UNLINK_BATCH = 500   # keys per pipelined UNLINK
+
+# TTL buckets for /status, as (label, upper bound in seconds)
+TTL_BUCKETS = [("<1m", 60), ("<1h", 3600), ("<1d", 86400), (">=1d", float("inf"))]
+
+
+def _namespace(key: str) -> str:
+    """docforge:templates:dept_hr → docforge:templates"""
+    return ":".join(key.split(":", 2)[:2])
+
+
+def _unlink(r, keys: list) -> None:
+    pipe = r.pipeline(transaction=False)
+    for key in keys:
+        pipe.unlink(key)
+    pipe.execute()
+
 
 @router.delete("/bust")
 def bust_cache():
     """Clear all DocForge cached data (departments + all templates)."""
     r = get_redis()
     if not r:
-        return {"message": "Redis not available — nothing to clear"}
+        clear_local_caches()
+        return {"message": "Redis not available — cleared this worker's local cache only"}
     try:
-        keys = r.keys("docforge:*")
-        if keys:
-            r.delete(*keys)
-        logger.info(f"Cache busted — {len(keys)} keys cleared")
-        return {"message": f"Cache cleared — {len(keys)} keys deleted", "keys": keys}
+        # Incremental SCAN + non-blocking UNLINK — never a single O(N) KEYS/DEL on shared Redis
+        deleted, batch = 0, []
+        for key in r.scan_iter(match=KEY_PATTERN, count=SCAN_COUNT):
+            batch.append(key)
+            if len(batch) >= UNLINK_BATCH:
+                _unlink(r, batch)
+                deleted += len(batch)
+                batch = []
+        if batch:
+            _unlink(r, batch)
+            deleted += len(batch)
+
+        # Drop every worker's L1 copy after Redis is empty, so none re-reads stale data
+        workers = publish_invalidation()
+        logger.info(f"Cache busted — {deleted} keys cleared, {workers} workers notified")
+        return {"message": f"Cache cleared — {deleted} keys deleted", "deleted": deleted}
     except Exception as e:
         return {"message": f"Cache bust failed: {e}"}
 
 
 @router.get("/status")
-def cache_status():
-    """Check what's currently cached."""
+def cache_status(
+    cursor: int = Query(0, ge=0, description="SCAN cursor from the previous page; 0 to start"),
+    count: int = Query(SCAN_COUNT, ge=1, le=5000, description="Approximate keys to inspect per page"),
+):
+    """
+    One page of cache statistics, grouped by key namespace.
+
+    Keep calling with the returned `cursor` until `done` is true and sum the
+    pages. Key names are never returned — only counts, memory and TTLs.
+    """
     r = get_redis()
     if not r:
         return {"redis": "unavailable"}
     try:
-        keys = r.keys("docforge:*")
+        next_cursor, keys = r.scan(cursor=cursor, match=KEY_PATTERN, count=count)
+
+        pipe = r.pipeline(transaction=False)
+        for key in keys:
+            pipe.memory_usage(key)
+            pipe.ttl(key)
+        # MEMORY USAGE can be disabled on managed Redis — report 0 rather than fail the page
+        replies = pipe.execute(raise_on_error=False)
+
+        namespaces = defaultdict(lambda: {
+            "count": 0,
+            "memory_bytes": 0,
+            "ttl": {"no_expiry": 0, **{label: 0 for label, _ in TTL_BUCKETS}},
+        })
+        for key, memory, ttl in zip(keys, replies[0::2], replies[1::2]):
+            if not isinstance(ttl, int) or ttl == -2:
+                continue  # expired between SCAN and the pipeline
+            ns = namespaces[_namespace(key)]
+            ns["count"]        += 1
+            ns["memory_bytes"] += memory if isinstance(memory, int) else 0
+            if ttl == -1:
+                ns["ttl"]["no_expiry"] += 1
+            else:
+                label = next(label for label, bound in TTL_BUCKETS if ttl < bound)
+                ns["ttl"][label] += 1
+
         return {
-            "redis": "connected",
-            "cached_keys": keys,
-            "count": len(keys),
+            "redis":      "connected",
+            "cursor":     next_cursor,
+            "done":       next_cursor == 0,
+            "scanned":    len(keys),
+            "namespaces": dict(namespaces),
         }
     except Exception as e:
-        return {"redis": "error", "detail": str(e)}
\ No newline at end of file
+        return {"redis": "error", "detail": str(e)}
+
+
+@router.get("/llm")
+def llm_cache_status():
+    """Hit/miss counters and size of the LLM response cache."""
+    return llm_cache.stats()
+
+
+@router.get("/prompt")
+def prompt_cache_status():
+    """Input, cached and output tokens per prompt task — how much of each prompt Azure served from its prompt cache."""
+    return llm_usage.stats()
+
+
+@router.get("/parse")
+def llm_parse_status():
+    """JSON parse outcomes of LLM responses per task — ok, repaired (salvaged) or failed (cost a retry)."""
+    return llm_usage.parse_stats()
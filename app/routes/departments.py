@@ -2,7 +2,7 @@ import json
 import logging
 from fastapi import APIRouter
 from app.db import get_db
-from app.redis_client import get_redis, CACHE_TTL
+from app.redis_client import get_redis, l1_cache, CACHE_TTL
 
 logger = logging.getLogger("docforge.departments")
 router = APIRouter(prefix="/departments", tags=["Departments"])
@@ -14,13 +14,20 @@ CACHE_KEY = "docforge:depts"
 def get_departments():
     r = get_redis()
 
-    # ── Try cache first ───────────────────────────────────────
+    # ── In-process L1 first — no network, no json.loads ───────
+    local = l1_cache.get(CACHE_KEY)
+    if local is not None:
+        return local
+
+    # ── Then Redis ────────────────────────────────────────────
     if r:
         try:
             cached = r.get(CACHE_KEY)
             if cached:
                 logger.info("departments: cache hit")
-                return json.loads(cached)
+                value = json.loads(cached)
+                l1_cache.set(CACHE_KEY, value)
+                return value
         except Exception as e:
             logger.warning(f"Redis read failed: {e}")
 
@@ -39,4 +46,6 @@ def get_departments():
         except Exception as e:
             logger.warning(f"Redis write failed: {e}")
 
+    l1_cache.set(CACHE_KEY, departments)
+
     return departments
\ No newline at end of file
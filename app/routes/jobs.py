@@ -0,0 +1,14 @@
+from fastapi import APIRouter, HTTPException
+from app.db import get_async_db
+from app.services.job_queue import job_view
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    """Poll a background job — status is queued, running, succeeded or failed."""
+    job = await get_async_db().jobs.find_one({"_id": job_id})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_view(job)
@@ -0,0 +1,41 @@
+from dataclasses import asdict
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from app.config import settings
+from app.db import get_async_db
+from app.template_cache import aget_template
+from app.services.llm_governor import llm_governor
+from app.services.llm_resilience import breaker_states
+from app.services.llm_routing import ROUTED_TASKS, resolve_route
+
+router = APIRouter(prefix="/llm", tags=["LLM"])
+
+
+@router.get("/governor")
+def governor_status():
+    """Calls and estimated tokens in flight, fair-queue depth and queue wait per class (interactive / batch)."""
+    return llm_governor.metrics()
+
+
+@router.get("/circuits")
+def circuit_status():
+    """Circuit breaker state per Azure deployment — closed, open (failing fast) or half_open (probing)."""
+    return {
+        "primary":   settings.AZURE_LLM_DEPLOYMENT_41_MINI,
+        "secondary": settings.AZURE_LLM_DEPLOYMENT_SECONDARY or None,
+        "circuits":  breaker_states(),
+    }
+
+
+@router.get("/routes")
+async def route_table(template_id: Optional[str] = Query(None, description="Apply this template's model_routing overrides")):
+    """Deployment, temperature, max_tokens and deadline each LLM task resolves to."""
+    overrides = None
+    if template_id:
+        template = await aget_template(get_async_db(), template_id)
+        if not template:
+            raise HTTPException(status_code=404, detail="Template not found")
+        overrides = template.model_routing
+    tasks = sorted({*ROUTED_TASKS, *settings.llm_routes, *(overrides or {})})
+    return {task: asdict(resolve_route(task, overrides)) for task in tasks}
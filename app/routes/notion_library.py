@@ -1,61 +1,85 @@
 import logging
-import requests as http_requests
-from fastapi import APIRouter, HTTPException
+import re
+from fastapi import APIRouter, Query
 
-from app.routes.sessions import (
-    NOTION_API_KEY, NOTION_DATABASE_ID,
-    NOTION_VERSION, NOTION_BASE_URL,
-    REQUEST_INTERVAL_SEC, _notion_request,
-)
+from app.db import get_async_db
+from app.services.job_queue import job_queue
+from app.services.notion_mirror import notion_mirror
+from app.services.rate_limiter import notion_rate_limiter
 
 logger = logging.getLogger("docforge.notion_library")
 router = APIRouter(prefix="/notion", tags=["Notion Library"])
 
+LIBRARY_PROJECTION = {"_id": 0, "synced_at": 0, "tag_list": 0, "last_edited_time": 0}
+
 
 @router.get("/library")
-def get_notion_library():
-    """Fetch all documents from the Notion liberary database."""
+async def get_notion_library(
+    industry:  str | None = Query(None, description="Exact industry, e.g. 'Human Resources'"),
+    tags:      str | None = Query(None, description="Comma-separated — matches docs with any of these tags"),
+    version:   str | None = Query(None, description="Exact version, e.g. 'v2'"),
+    q:         str | None = Query(None, description="Case-insensitive title search"),
+    page:      int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+):
+    """
+    Documents published to the Notion library, newest first.
+
+    Served from the Mongo mirror — Notion is never called here. The mirror is
+    refreshed in the background; `synced_at` says how fresh this view is.
+    """
+    db = get_async_db()
+
+    query = {}
+    if industry:
+        query["industry"] = industry
+    if version:
+        query["version"] = version
+    if tags:
+        query["tag_list"] = {"$in": [t.strip() for t in tags.split(",") if t.strip()]}
+    if q:
+        query["title"] = {"$regex": re.escape(q), "$options": "i"}
+
+    total  = await db.notion_library.count_documents(query)
+    cursor = (db.notion_library.find(query, LIBRARY_PROJECTION)
+              .sort("created_time", -1)
+              .skip((page - 1) * page_size)
+              .limit(page_size))
+    docs = await cursor.to_list(length=page_size)
+
+    return {
+        "docs":      docs,
+        "total":     total,
+        "page":      page,
+        "page_size": page_size,
+        "has_more":  page * page_size < total,
+        "synced_at": await notion_mirror.last_sync(),
+    }
 
-    # Query the Notion database — sorted by created time descending
-    payload = {
-        "sorts": [{"timestamp": "created_time", "direction": "descending"}],
-        "page_size": 50,
+
+@router.get("/library/filters")
+async def get_notion_library_filters():
+    """Distinct industries, versions and tags in the mirror — options for the library filters."""
+    db = get_async_db()
+    return {
+        "industries": sorted(v for v in await db.notion_library.distinct("industry") if v),
+        "versions":   sorted(v for v in await db.notion_library.distinct("version") if v),
+        "tags":       sorted(v for v in await db.notion_library.distinct("tag_list") if v),
     }
 
-    try:
-        result = _notion_request(
-            "POST",
-            f"{NOTION_BASE_URL}/databases/{NOTION_DATABASE_ID}/query",
-            payload,
-        )
-    except HTTPException as e:
-        raise e
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Notion fetch failed: {str(e)}")
-
-    docs = []
-    for page in result.get("results", []):
-        props = page.get("properties", {})
-
-        def get_text(prop_name):
-            prop = props.get(prop_name, {})
-            ptype = prop.get("type")
-            if ptype == "title":
-                items = prop.get("title", [])
-            elif ptype == "rich_text":
-                items = prop.get("rich_text", [])
-            else:
-                return ""
-            return "".join(t.get("plain_text", "") for t in items)
-
-        docs.append({
-            "title":        get_text("Name"),
-            "industry":     get_text("industry"),
-            "version":      get_text("version"),
-            "tags":         get_text("tags"),
-            "url":          page.get("url", ""),
-            "created_time": page.get("created_time", ""),
-            "page_id":      page.get("id", ""),
-        })
-
-    return {"docs": docs, "total": len(docs)}
\ No newline at end of file
+
+async def _refresh_library(progress, full: bool):
+    return await notion_mirror.refresh(full=full, progress=progress)
+
+
+@router.post("/library/refresh", status_code=202)
+async def refresh_notion_library(full: bool = Query(False, description="Re-read every page and drop deleted ones")):
+    """Queue a mirror refresh now instead of waiting for the background interval."""
+    job_id = await job_queue.submit("notion_mirror_refresh", _refresh_library, full)
+    return {"job_id": job_id, "status": "queued", "poll_url": f"/jobs/{job_id}"}
+
+
+@router.get("/rate_limit")
+def get_notion_rate_limit():
+    """Shared Notion token bucket — queue depth, waits and 429s across all workers."""
+    return notion_rate_limiter.metrics()
@@ -1,31 +1,34 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional
 import uuid
-import textwrap
-import time
-import re
-import requests as http_requests
-from fastapi.responses import StreamingResponse
-from io import BytesIO
-from fpdf import FPDF
-from app.db import get_db
+import json
+import hashlib
+import difflib
+import asyncio
+import logging
+from fastapi.responses import Response, StreamingResponse
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.db import get_db, get_async_db
+from app.template_cache import get_template, aget_template
 from app.services.question_service import QuestionService
 from app.services.section_service import SectionService
+from app.services.llm_provider import LLMProvider, get_llm_provider
+from app.services.llm_governor import set_llm_tenant
+from app.services.job_queue import JobProgress, job_queue
+from app.services.notion_client import NOTION_DATABASE_ID, NotionAPIError, notion_client
+from app.services.markdown_blocks import AST_VERSION, document_blocks, iter_blocks
+from app.services.notion_mirror import notion_mirror
+from app.services.pdf_renderer import pdf_renderer
+from app.services.pdf_store import RENDERER_VERSION, iter_pdf, pdf_hash, store_pdf
 from app.config import settings
-# ─── Notion API config ────────────────────────────────────────
-NOTION_API_KEY     = settings.notion_api_key
-NOTION_DATABASE_ID = settings.notion_database_id
-NOTION_VERSION      = "2022-06-28"
-NOTION_BASE_URL     = "https://api.notion.com/v1"
 
 # ─── Notion API limits ────────────────────────────────────────
+# Connection reuse, pacing (3 req/s per integration) and retries live in services/notion_client.py
 MAX_BLOCKS_PER_REQUEST : int   = 95    # Notion hard limit per append call
 RICH_TEXT_MAX_CHARS    : int   = 1950  # Notion hard limit per rich-text object
-REQUEST_INTERVAL_SEC   : float = 0.4   # ~2.5 req/s — well under the 3 req/s cap
-MAX_RETRIES            : int   = 5     # max back-off retries on 429
-BACKOFF_BASE_SEC       : float = 1.5   # exponential back-off base
 
 DEPT_MAP = {
     "dept_hr": "Human Resources", "dept_finance": "Finance",
@@ -37,15 +40,21 @@ DEPT_MAP = {
 }
 
 router = APIRouter(prefix="/sessions", tags=["Sessions"])
+logger = logging.getLogger("docforge.sessions")
 
 # ─── Pydantic Models ───────────────────────────────────────────
 class SessionCreateRequest(BaseModel):
     template_id: str
+    company_context: Optional[dict] = None   # stored on the session — lets questions be prefetched
 
 class GenerateQuestionsRequest(BaseModel):
     section_id: str
     company_context: Optional[dict] = None
 
+class GenerateQuestionsBatchRequest(BaseModel):
+    section_ids: Optional[list[str]] = None   # default: every section in the template
+    company_context: Optional[dict] = None
+
 class SubmitAnswersRequest(BaseModel):
     section_id: str
     answers: list  # list of {question_id, answer}
@@ -54,6 +63,9 @@ class GenerateSectionRequest(BaseModel):
     section_id: str
     company_context: Optional[dict] = None
 
+class GenerateAllRequest(BaseModel):
+    company_context: Optional[dict] = None
+
 class ApproveSectionRequest(BaseModel):
     section_id: str
     edited_content: Optional[str] = None
@@ -68,28 +80,32 @@ class EnhanceSectionRequest(BaseModel):
 
 class PublishRequest(BaseModel):
     doc_title: Optional[str] = "Document"
+    mode: Literal["new", "update"] = "new"   # "update" patches the last published page in place
 
 # ─── Create Session ────────────────────────────────────────────
 @router.post("/")
-def create_session(payload: SessionCreateRequest):
+def create_session(payload: SessionCreateRequest, background_tasks: BackgroundTasks):
     db = get_db()
-    template = db.document_templates.find_one({"_id": payload.template_id})
+    template = get_template(db, payload.template_id)
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
 
-    sections       = template["template_json"]["sections"]
-    total_sections = len(sections)
+    total_sections = len(template.section_order)
     session_id     = f"sess_{uuid.uuid4().hex[:8]}"
 
     db.doc_sessions.insert_one({
         "_id":                   session_id,
         "template_id":           payload.template_id,
-        "dept_id":               template["dept_id"],
+        "dept_id":               template.template["dept_id"],
         "status":                "in_progress",
         "current_section_index": 0,
         "total_sections":        total_sections,
+        "company_context":       payload.company_context,
         "created_at":            datetime.utcnow(),
     })
+    if payload.company_context:
+        # Without context the questions would ask what the company is — wait for the first request
+        background_tasks.add_task(_prefetch_questions, session_id, 0)
     return {"session_id": session_id, "total_sections": total_sections}
 
 # ─── Current Section ───────────────────────────────────────────
@@ -99,12 +115,12 @@ def get_current_section(session_id: str):
     session  = db.doc_sessions.find_one({"_id": session_id})
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
-    template = db.document_templates.find_one({"_id": session["template_id"]})
+    template = get_template(db, session["template_id"])
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
 
     idx      = session.get("current_section_index", 0)
-    sections = template["template_json"]["sections"]
+    sections = template.sections
 
     if idx >= len(sections):
         return {"all_sections_done": True, "current_index": idx, "total_sections": len(sections)}
@@ -116,46 +132,202 @@ def get_current_section(session_id: str):
         "total_sections":    len(sections),
     }
 
+# ─── Question Helpers ──────────────────────────────────────────
+# In-flight generations in this process, by (session_id, section_id, context key). A prefetch
+# and a user request for the same section and company context share one LLM call; across
+# workers the unique (session_id, section_id) index keeps a single stored copy.
+_question_tasks: dict[tuple, asyncio.Task] = {}
+
+def _context_key(company_context: Optional[dict]) -> str:
+    """Fingerprint of the company context questions were generated with."""
+    return hashlib.sha256(json.dumps(company_context or {}, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def _usable(doc: Optional[dict], ctx_key: str) -> bool:
+    """
+    Stored questions can be served for this context — generated with it, stored before
+    contexts were tracked, or already answered (never pull questions out from under answers).
+    """
+    if not doc or "questions" not in doc:
+        return False
+    return doc.get("context_key", ctx_key) == ctx_key or bool(doc.get("answers"))
+
+async def _store_questions(db, session_id: str, section: dict, questions: list, ctx_key: str) -> list:
+    # Store generated questions — a concurrent request may have won the race
+    try:
+        await db.session_questions.insert_one({
+            "_id":         f"q_{uuid.uuid4().hex[:8]}",
+            "session_id":  session_id,
+            "section_id":  section["id"],
+            "questions":   questions,
+            "context_key": ctx_key,
+            "answers":     [],
+            "created_at":  datetime.utcnow(),
+        })
+    except DuplicateKeyError:
+        # Fill in a doc made by submit_answers, or replace a set made for a different
+        # company context unless it has been answered
+        replaced = await db.session_questions.find_one_and_update(
+            {"session_id": session_id, "section_id": section["id"], "$or": [
+                {"questions": {"$exists": False}},
+                {"context_key": {"$ne": ctx_key}, "answers.0": {"$exists": False}},
+            ]},
+            {"$set": {"questions": questions, "context_key": ctx_key, "updated_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER,
+        )
+        existing = replaced or await db.session_questions.find_one({
+            "session_id": session_id,
+            "section_id": section["id"],
+        })
+        return existing.get("questions", questions)
+    return questions
+
+async def _create_questions(db, session_id: str, section: dict, company_context: dict, llm,
+                            routing: Optional[dict] = None) -> list:
+    # Generate questions via AI — pass company_context so LLM doesn't ask about it
+    svc = QuestionService(llm, routing)
+    questions = await svc.generate_questions(section, company_context or {})
+    return await _store_questions(db, session_id, section, questions, _context_key(company_context))
+
+async def _create_from_batch(db, session_id: str, section: dict, batch: asyncio.Task, ctx_key: str) -> list:
+    questions = (await asyncio.shield(batch))[section["id"]]
+    return await _store_questions(db, session_id, section, questions, ctx_key)
+
+def _track(key: tuple, coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _question_tasks[key] = task
+    task.add_done_callback(lambda _: _question_tasks.pop(key, None))
+    return task
+
+async def _questions_for(db, session_id: str, section: dict, company_context: Optional[dict],
+                         llm: Optional[LLMProvider] = None, routing: Optional[dict] = None) -> list:
+    """
+    Stored questions for a section, generated at most once per process however many callers
+    ask. Questions stored for a different company context are regenerated.
+    """
+    ctx_key  = _context_key(company_context)
+    existing = await db.session_questions.find_one({
+        "session_id": session_id,
+        "section_id": section["id"],
+    })
+    if _usable(existing, ctx_key):
+        return existing["questions"]
+
+    key  = (session_id, section["id"], ctx_key)
+    task = _question_tasks.get(key) or _track(
+        key, _create_questions(db, session_id, section, company_context, llm, routing)
+    )
+    # shield — a caller that disconnects must not cancel a generation others are waiting on
+    return await asyncio.shield(task)
+
+async def _questions_for_many(db, session_id: str, sections: list, company_context: Optional[dict],
+                              llm: Optional[LLMProvider] = None, routing: Optional[dict] = None) -> dict:
+    """
+    _questions_for over several sections. Sections with nothing stored or in flight
+    share one batched generation; returns {section_id: questions or the exception}.
+    """
+    ctx_key = _context_key(company_context)
+    stored  = {
+        d["section_id"]: d["questions"]
+        async for d in db.session_questions.find(
+            {"session_id": session_id, "section_id": {"$in": [s["id"] for s in sections]}},
+            {"section_id": 1, "questions": 1, "context_key": 1, "answers": 1},
+        )
+        if _usable(d, ctx_key)
+    }
+    missing = [s for s in sections
+               if s["id"] not in stored and (session_id, s["id"], ctx_key) not in _question_tasks]
+    if missing:
+        batch = asyncio.create_task(QuestionService(llm, routing).generate_questions_batch(missing, company_context or {}))
+        for sec in missing:
+            _track((session_id, sec["id"], ctx_key), _create_from_batch(db, session_id, sec, batch, ctx_key))
+
+    pending = {s["id"]: _question_tasks[(session_id, s["id"], ctx_key)] for s in sections if s["id"] not in stored}
+    results = await asyncio.gather(*(asyncio.shield(t) for t in pending.values()), return_exceptions=True)
+    return {**stored, **dict(zip(pending, results))}
+
+async def _prefetch_questions(session_id: str, from_index: int) -> None:
+    """
+    Background task: store questions for the next question_prefetch_sections sections
+    so moving to the next section does not wait on the LLM.
+    """
+    if settings.question_prefetch_sections <= 0:
+        return
+    set_llm_tenant(session_id, "batch")
+    db = get_async_db()
+    session = await db.doc_sessions.find_one({"_id": session_id}, {"template_id": 1, "company_context": 1})
+    if not session or not session.get("company_context"):
+        return   # questions made without the company context would have to be regenerated
+    template = await aget_template(db, session["template_id"])
+    if not template:
+        return
+
+    upcoming = [template.section(sid) for sid in
+                template.section_order[from_index : from_index + settings.question_prefetch_sections]]
+    # One batched LLM call for every upcoming section not stored yet
+    results = await _questions_for_many(db, session_id, upcoming, session.get("company_context"),
+                                        routing=template.model_routing)
+    for section_id, result in results.items():
+        if isinstance(result, Exception):
+            logger.warning(f"Question prefetch failed for {session_id}/{section_id}: {result}")
+
 # ─── Generate Questions ────────────────────────────────────────
 @router.post("/{session_id}/generate_questions")
-async def generate_questions(session_id: str, payload: GenerateQuestionsRequest):
-    db = get_db()
-    session = db.doc_sessions.find_one({"_id": session_id})
+async def generate_questions(
+    session_id: str,
+    payload: GenerateQuestionsRequest,
+    llm: LLMProvider = Depends(get_llm_provider),
+):
+    db = get_async_db()
+    set_llm_tenant(session_id)
+    session = await db.doc_sessions.find_one({"_id": session_id})
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
-    template = db.document_templates.find_one({"_id": session["template_id"]})
+    template = await aget_template(db, session["template_id"])
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
 
     # Get section metadata
-    sections = template["template_json"]["sections"]
-    section  = next((s for s in sections if s["id"] == payload.section_id), None)
+    section = template.section(payload.section_id)
     if not section:
         raise HTTPException(status_code=404, detail="Section not found in template")
 
-    # Check if questions already generated for this section
-    existing = db.session_questions.find_one({
-        "session_id": session_id,
-        "section_id": payload.section_id,
-    })
-    if existing:
-        return {"questions": existing["questions"]}
+    company_context = payload.company_context or session.get("company_context")
+    if payload.company_context and not session.get("company_context"):
+        # Sessions created without context — keep it so later prefetches can use it
+        await db.doc_sessions.update_one({"_id": session_id}, {"$set": {"company_context": payload.company_context}})
 
-    # Generate questions via AI — pass company_context so LLM doesn't ask about it
-    svc = QuestionService()
-    questions = await svc.generate_questions(section, payload.company_context or {})
+    # Already stored (often by the prefetch), in flight, or generated now
+    questions = await _questions_for(db, session_id, section, company_context, llm, template.model_routing)
+    return {"questions": questions}
 
-    # Store generated questions
-    db.session_questions.insert_one({
-        "_id":        f"q_{uuid.uuid4().hex[:8]}",
-        "session_id": session_id,
-        "section_id": payload.section_id,
-        "questions":  questions,
-        "answers":    [],
-        "created_at": datetime.utcnow(),
-    })
+@router.post("/{session_id}/generate_questions_batch")
+async def generate_questions_batch(
+    session_id: str,
+    payload: GenerateQuestionsBatchRequest,
+    llm: LLMProvider = Depends(get_llm_provider),
+):
+    """Questions for many sections (all by default) in batched LLM calls, keyed by section id."""
+    db = get_async_db()
+    set_llm_tenant(session_id, "batch")
+    session = await db.doc_sessions.find_one({"_id": session_id})
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    template = await aget_template(db, session["template_id"])
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
 
-    return {"questions": questions}
+    section_ids = payload.section_ids or template.section_order
+    unknown     = [sid for sid in section_ids if not template.section(sid)]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Sections not found in template: {', '.join(unknown)}")
+
+    company_context = payload.company_context or session.get("company_context")
+    results = await _questions_for_many(db, session_id, [template.section(sid) for sid in section_ids],
+                                        company_context, llm, template.model_routing)
+    return {
+        "questions": {sid: r for sid, r in results.items() if not isinstance(r, Exception)},
+        "failed":    {sid: str(r) for sid, r in results.items() if isinstance(r, Exception)},
+    }
 
 # ─── Submit Answers ────────────────────────────────────────────
 @router.post("/{session_id}/submit_answers")
@@ -172,58 +344,42 @@ def submit_answers(session_id: str, payload: SubmitAnswersRequest):
     )
     return {"message": "Answers saved"}
 
-# ─── Generate Section ──────────────────────────────────────────
-@router.post("/{session_id}/generate_section")
-async def generate_section(session_id: str, payload: GenerateSectionRequest):
-    db = get_db()
-    session = db.doc_sessions.find_one({"_id": session_id})
-    if not session:
-        raise HTTPException(status_code=404, detail="Session not found")
-    template = db.document_templates.find_one({"_id": session["template_id"]})
-    if not template:
-        raise HTTPException(status_code=404, detail="Template not found")
-
-    sections = template["template_json"]["sections"]
-    section  = next((s for s in sections if s["id"] == payload.section_id), None)
-    if not section:
-        raise HTTPException(status_code=404, detail="Section not found")
-
-    # Fetch Q&A — qa_doc may be None if questions were skipped
-    qa_doc    = db.session_questions.find_one({"session_id": session_id, "section_id": payload.section_id})
+# ─── Section Helpers ───────────────────────────────────────────
+def _build_qa_pairs(qa_doc: Optional[dict]) -> list:
+    """Pair stored questions with answers — handles both dict answers and plain strings."""
     questions = qa_doc["questions"] if qa_doc else []
     answers   = qa_doc["answers"]   if qa_doc else []
 
-    # Build qa_pairs safely — handle both dict answers and plain strings
     qa_pairs = []
     for q, a in zip(questions, answers):
         q_text = q.get("question_text", "") if isinstance(q, dict) else str(q)
         a_text = a.get("answer", "")        if isinstance(a, dict) else str(a)
         qa_pairs.append({"question": q_text, "answer": a_text})
+    return qa_pairs
 
-    template_json     = template["template_json"]
-    # Use .copy() to avoid mutating the template dict fetched from MongoDB
+def _section_rules(template_json: dict, company_context: Optional[dict]) -> tuple:
+    """Copy generation/terminology rules so the template dict fetched from MongoDB is never mutated."""
     generation_rules  = dict(template_json.get("generation_rules", {}))
     terminology_rules = dict(template_json.get("terminology_rules", {}))
 
     # Inject company context into generation rules so section writer has full context
-    if payload.company_context:
-        generation_rules["company_context"] = payload.company_context
-
-    svc     = SectionService()
-    content = await svc.generate_section(section, qa_pairs, generation_rules, terminology_rules)
+    if company_context:
+        generation_rules["company_context"] = company_context
+    return generation_rules, terminology_rules
 
-    # Save/update section
-    existing_sec = db.doc_sections.find_one({"session_id": session_id, "section_id": payload.section_id})
+async def _save_section(db, session_id: str, section: dict, content: str) -> None:
+    """Insert or update the generated content for one section."""
+    existing_sec = await db.doc_sections.find_one({"session_id": session_id, "section_id": section["id"]})
     if existing_sec:
-        db.doc_sections.update_one(
+        await db.doc_sections.update_one(
             {"_id": existing_sec["_id"]},
             {"$set": {"content": content, "status": "generated", "updated_at": datetime.utcnow()}}
         )
     else:
-        db.doc_sections.insert_one({
+        await db.doc_sections.insert_one({
             "_id":           f"sec_{uuid.uuid4().hex[:8]}",
             "session_id":    session_id,
-            "section_id":    payload.section_id,
+            "section_id":    section["id"],
             "section_title": section["title"],
             "version":       1,
             "content":       content,
@@ -231,20 +387,195 @@ async def generate_section(session_id: str, payload: GenerateSectionRequest):
             "created_at":    datetime.utcnow(),
         })
 
+# ─── Generate Section ──────────────────────────────────────────
+@router.post("/{session_id}/generate_section")
+async def generate_section(
+    session_id: str,
+    payload: GenerateSectionRequest,
+    llm: LLMProvider = Depends(get_llm_provider),
+):
+    db = get_async_db()
+    set_llm_tenant(session_id)
+    session = await db.doc_sessions.find_one({"_id": session_id})
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    template = await aget_template(db, session["template_id"])
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+
+    section = template.section(payload.section_id)
+    if not section:
+        raise HTTPException(status_code=404, detail="Section not found")
+
+    # Fetch Q&A — qa_doc may be None if questions were skipped
+    qa_doc   = await db.session_questions.find_one({"session_id": session_id, "section_id": payload.section_id})
+    qa_pairs = _build_qa_pairs(qa_doc)
+
+    generation_rules, terminology_rules = _section_rules(template.template_json, payload.company_context)
+
+    svc     = SectionService(llm)
+    content = await svc.generate_section(section, qa_pairs, generation_rules, terminology_rules)
+
+    await _save_section(db, session_id, section, content)
+
     return {"content": content}
 
+# ─── Stream Section (SSE) ──────────────────────────────────────
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.get("/{session_id}/generate_section/stream")
+async def stream_section(
+    session_id: str,
+    section_id: str = Query(...),
+    company_context: Optional[str] = Query(None, description="JSON-encoded company context"),
+    llm: LLMProvider = Depends(get_llm_provider),
+):
+    """
+    Same as generate_section, but streams tokens as Server-Sent Events.
+
+    Emits `token` events ({"delta": ...}) while the model writes, then one
+    `done` event ({"content": ...}) after the section is saved. If the LLM
+    call fails mid-stream an `error` event is sent and nothing is saved; a
+    failed save also ends the stream with an `error` event.
+    """
+    db = get_async_db()
+    set_llm_tenant(session_id)
+    session = await db.doc_sessions.find_one({"_id": session_id})
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    template = await aget_template(db, session["template_id"])
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+
+    section = template.section(section_id)
+    if not section:
+        raise HTTPException(status_code=404, detail="Section not found")
+
+    try:
+        context = json.loads(company_context) if company_context else None
+    except ValueError:
+        raise HTTPException(status_code=422, detail="company_context must be valid JSON")
+
+    qa_doc   = await db.session_questions.find_one({"session_id": session_id, "section_id": section_id})
+    qa_pairs = _build_qa_pairs(qa_doc)
+    generation_rules, terminology_rules = _section_rules(template.template_json, context)
+
+    svc = SectionService(llm)
+
+    async def event_stream():
+        parts = []
+        try:
+            async for token in svc.stream_section(section, qa_pairs, generation_rules, terminology_rules):
+                parts.append(token)
+                yield _sse("token", {"delta": token})
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+            return
+
+        content = "".join(parts).strip()
+        try:
+            await _save_section(db, session_id, section, content)
+        except Exception as e:
+            # The client already has every token — tell it the section was not kept
+            logger.warning(f"Saving streamed section {section_id} of {session_id} failed: {e}")
+            yield _sse("error", {"detail": f"Section generated but could not be saved: {e}"})
+            return
+        yield _sse("done", {"content": content})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ─── Generate All Sections ─────────────────────────────────────
+@router.post("/{session_id}/generate_all")
+async def generate_all(
+    session_id: str,
+    payload: GenerateAllRequest = None,
+    llm: LLMProvider = Depends(get_llm_provider),
+):
+    """
+    Write every section whose answers are already present, concurrently.
+
+    At most `generate_all_concurrency` LLM calls run at once. Each section is
+    saved to doc_sections as soon as its own call finishes, so a slow or
+    failing section never holds back the others. Approved sections are left
+    untouched.
+    """
+    db = get_async_db()
+    set_llm_tenant(session_id, "batch")
+    session = await db.doc_sessions.find_one({"_id": session_id})
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    template = await aget_template(db, session["template_id"])
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+
+    company_context = payload.company_context if payload else None
+    template_json   = template.template_json
+    qa_docs  = {d["section_id"]: d async for d in db.session_questions.find({"session_id": session_id})}
+    approved = {
+        d["section_id"]
+        async for d in db.doc_sections.find({"session_id": session_id, "status": "approved"}, {"section_id": 1})
+    }
+
+    pending, skipped = [], []
+    for sec in template.sections:
+        qa_doc = qa_docs.get(sec["id"])
+        if sec["id"] in approved:
+            skipped.append({"section_id": sec["id"], "reason": "already approved"})
+        elif not qa_doc or not qa_doc.get("answers"):
+            skipped.append({"section_id": sec["id"], "reason": "answers missing"})
+        else:
+            pending.append((sec, qa_doc))
+
+    svc       = SectionService(llm)
+    semaphore = asyncio.Semaphore(max(settings.generate_all_concurrency, 1))
+
+    async def _generate_one(section: dict, qa_doc: dict) -> dict:
+        generation_rules, terminology_rules = _section_rules(template_json, company_context)
+        async with semaphore:
+            try:
+                content = await svc.generate_section(
+                    section, _build_qa_pairs(qa_doc), generation_rules, terminology_rules
+                )
+            except Exception as e:
+                return {"section_id": section["id"], "status": "failed", "detail": str(e)}
+        try:
+            await _save_section(db, session_id, section, content)
+        except Exception as e:
+            # One failed write must not lose the sections the other tasks already generated
+            logger.warning(f"Saving generated section {section['id']} of {session_id} failed: {e}")
+            return {"section_id": section["id"], "status": "failed", "detail": str(e)}
+        return {
+            "section_id":    section["id"],
+            "section_title": section["title"],
+            "status":        "generated",
+            "content":       content,
+        }
+
+    results = await asyncio.gather(*(_generate_one(sec, qa) for sec, qa in pending))
+
+    return {
+        "generated": [r for r in results if r["status"] == "generated"],
+        "failed":    [r for r in results if r["status"] == "failed"],
+        "skipped":   skipped,
+    }
+
 # ─── Approve Section ───────────────────────────────────────────
 @router.post("/{session_id}/approve_section")
-def approve_section(session_id: str, payload: ApproveSectionRequest):
+def approve_section(session_id: str, payload: ApproveSectionRequest, background_tasks: BackgroundTasks):
     db = get_db()
     session = db.doc_sessions.find_one({"_id": session_id})
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    template = db.document_templates.find_one({"_id": session["template_id"]})
+    template = get_template(db, session["template_id"])
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
-    total = len(template["template_json"]["sections"])
+    total = len(template.section_order)
 
     sec_doc = db.doc_sections.find_one({"session_id": session_id, "section_id": payload.section_id})
     if not sec_doc:
@@ -263,6 +594,8 @@ def approve_section(session_id: str, payload: ApproveSectionRequest):
         {"_id": session_id},
         {"$set": {"current_section_index": new_index}}
     )
+    if new_index < total:
+        background_tasks.add_task(_prefetch_questions, session_id, new_index)
 
     return {
         "message":          f"Section '{payload.section_id}' approved",
@@ -289,35 +622,39 @@ def get_sections(session_id: str):
 
 # ─── Enhance Section ───────────────────────────────────────────
 @router.post("/{session_id}/enhance_section")
-async def enhance_section(session_id: str, payload: EnhanceSectionRequest):
-    db = get_db()
+async def enhance_section(
+    session_id: str,
+    payload: EnhanceSectionRequest,
+    llm: LLMProvider = Depends(get_llm_provider),
+):
+    db = get_async_db()
+    set_llm_tenant(session_id)
 
     # Get session & template
-    session = db.doc_sessions.find_one({"_id": session_id})
+    session = await db.doc_sessions.find_one({"_id": session_id})
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    template = db.document_templates.find_one({"_id": session["template_id"]})
+    template = await aget_template(db, session["template_id"])
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
 
-    template_json = template["template_json"]
-    sections      = template_json.get("sections", [])
+    template_json = template.template_json
 
     # Find the section metadata from template
-    section_meta = next((s for s in sections if s["id"] == payload.section_id), None)
+    section_meta = template.section(payload.section_id)
     if not section_meta:
         raise HTTPException(status_code=404, detail=f"Section '{payload.section_id}' not found in template")
 
     # Get the current approved content
-    sec_doc = db.doc_sections.find_one({"session_id": session_id, "section_id": payload.section_id})
+    sec_doc = await db.doc_sections.find_one({"session_id": session_id, "section_id": payload.section_id})
     if not sec_doc:
         raise HTTPException(status_code=404, detail="Section content not found")
 
     current_content = sec_doc.get("content", "")
     generation_rules = dict(template_json.get("generation_rules", {}))
 
-    svc = SectionService()
+    svc = SectionService(llm)
     enhanced = await svc.enhance_section(
         section_json     = section_meta,
         current_content  = current_content,
@@ -335,174 +672,143 @@ async def enhance_section(session_id: str, payload: EnhanceSectionRequest):
 
 # ─── Compile ───────────────────────────────────────────────────
 @router.post("/{session_id}/compile")
-def compile_document(session_id: str, payload: CompileRequest = None):
-    db = get_db()
-    session = db.doc_sessions.find_one({"_id": session_id})
+async def compile_document(session_id: str, payload: CompileRequest = None):
+    db = get_async_db()
+    session = await db.doc_sessions.find_one({"_id": session_id}, {"template_id": 1})
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
-    template = db.document_templates.find_one({"_id": session["template_id"]})
+    template = await aget_template(db, session["template_id"])
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
 
-    sections = template["template_json"]["sections"]
-    compiled = []
-    for sec in sections:
-        sec_doc = db.doc_sections.find_one({
-            "session_id": session_id,
-            "section_id": sec["id"],
-            "status":     "approved",
+    # One round trip for every approved section, ordered in memory by template order
+    approved = {
+        d["section_id"]: d
+        async for d in db.doc_sections.find(
+            {"session_id": session_id, "status": "approved"},
+            {"section_id": 1, "section_title": 1, "content": 1},
+        )
+    }
+    section_ids = template.section_order
+    missing     = [sid for sid in section_ids if sid not in approved]
+    if missing:
+        raise HTTPException(status_code=400, detail={
+            "message":          f"Sections not approved yet: {', '.join(missing)}",
+            "missing_sections": missing,
         })
-        if not sec_doc:
-            raise HTTPException(status_code=400, detail=f"Section '{sec['id']}' not approved yet")
-        compiled.append(sec_doc)
+    compiled = [approved[sid] for sid in section_ids]
 
     final_content = "\n\n---\n\n".join(
         f"## {s['section_title']}\n\n{s['content']}" for s in compiled
     )
 
     doc_title = (payload.doc_title if payload and payload.doc_title else
-                 template.get("label") or template.get("doc_name") or "Document")
-
-    doc_id = f"doc_{uuid.uuid4().hex[:8]}"
-    existing = db.generated_documents.find_one({"session_id": session_id})
-    if existing:
-        db.generated_documents.update_one(
-            {"_id": existing["_id"]},
-            {"$set": {
+                 template.template.get("label") or template.template.get("doc_name") or "Document")
+
+    # Upsert in one call — keeps the original _id / created_at on recompile
+    now    = datetime.utcnow()
+    blocks = list(iter_blocks(final_content))
+    digest = pdf_hash(final_content, doc_title)
+    doc = await db.generated_documents.find_one_and_update(
+        {"session_id": session_id},
+        {
+            "$set": {
                 "compiled_content": final_content,
+                # Tokenized once here; the PDF and Notion exporters both read this
+                "blocks":           blocks,
+                "ast_version":      AST_VERSION,
                 "doc_title":        doc_title,
-                "updated_at":       datetime.utcnow(),
-            }}
-        )
-        doc_id = existing["_id"]
-    else:
-        db.generated_documents.insert_one({
-            "_id":              doc_id,
-            "session_id":       session_id,
-            "doc_title":        doc_title,
-            "compiled_content": final_content,
-            "created_at":       datetime.utcnow(),
-        })
-
-    return {"message": "Document compiled", "document_id": doc_id, "doc_title": doc_title}
-
-# ─── PDF Helpers ───────────────────────────────────────────────
-class DocForgePDF(FPDF):
-    doc_title: str = "Document"
-
-    def header(self):
-        self.set_font("Helvetica", "B", 9)
-        self.set_text_color(160, 160, 160)
-        self.cell(0, 8, f"DocForge  |  {self.doc_title}", align="R")
-        self.ln(8)
-        self.set_text_color(0, 0, 0)
-
-def clean(text: str) -> str:
-    """Replace known unicode chars and strip anything outside latin-1 range."""
-    replacements = {
-        "•": "-",   # bullet •
-        "–": "-",   # en dash
-        "—": "-",   # em dash
-        "‘": "'",   # left single quote
-        "’": "'",   # right single quote
-        "“": '"',   # left double quote
-        "”": '"',   # right double quote
-        "₹": "Rs.", # rupee sign ₹
-        "…": "...", # ellipsis
-        " ": " ",   # non-breaking space
-        "**": "",        # strip markdown bold markers
-        "__": "",        # strip markdown underline markers
-    }
-    for char, replacement in replacements.items():
-        text = text.replace(char, replacement)
-    # Final safety net: drop anything still outside latin-1
-    return text.encode("latin-1", errors="ignore").decode("latin-1")
-
-def safe_multicell(pdf, text, line_height=7, width=95):
-    """Prevents FPDFException: Not enough horizontal space to render a single character"""
-    pdf.set_x(pdf.l_margin)
-    wrapped = "\n".join(
-        textwrap.wrap(
-            clean(text),
-            width=width,
-            break_long_words=True,
-            replace_whitespace=False,
-        )
+                # ETag of the PDF — downloads answer If-None-Match from it without rendering
+                "content_hash":     digest,
+                "pdf_renderer":     RENDERER_VERSION,
+                "updated_at":       now,
+            },
+            "$setOnInsert": {
+                "_id":        f"doc_{uuid.uuid4().hex[:8]}",
+                "created_at": now,
+            },
+        },
+        upsert=True,
+        projection={"_id": 1, "pdf": 1},
+        return_document=ReturnDocument.AFTER,
     )
-    pdf.multi_cell(0, line_height, wrapped)
-
-def render_markdown_to_pdf(content: str, doc_title: str = "Document") -> bytes:
-    pdf = DocForgePDF()
-    pdf.doc_title = clean(doc_title)
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.add_page()
-
-    # ── Title block on first page ──────────────────────────────
-    pdf.set_font("Helvetica", "B", 24)
-    pdf.set_text_color(15, 32, 68)   # dark navy
-    safe_multicell(pdf, doc_title, 12, 90)
-    pdf.ln(3)
-    pdf.set_draw_color(79, 110, 247)  # accent blue
-    pdf.set_line_width(0.8)
-    pdf.line(pdf.l_margin, pdf.get_y(), pdf.l_margin + 60, pdf.get_y())
-    pdf.set_line_width(0.2)
-    pdf.set_draw_color(0, 0, 0)
-    pdf.set_text_color(0, 0, 0)
-    pdf.ln(8)
-
-    # Clean entire content FIRST — strip all unicode the font can't handle
-    content = clean(content)
-    for line in content.split("\n"):
-        stripped = line.strip()
-        if stripped.startswith("### "):
-            pdf.ln(3)
-            pdf.set_font("Helvetica", "B", 12)
-            safe_multicell(pdf, stripped[4:], 7)
-            pdf.ln(1)
-        elif stripped.startswith("## "):
-            pdf.ln(4)
-            pdf.set_font("Helvetica", "B", 14)
-            safe_multicell(pdf, stripped[3:], 8)
-            pdf.ln(2)
-        elif stripped.startswith("# "):
-            pdf.ln(6)
-            pdf.set_font("Helvetica", "B", 18)
-            safe_multicell(pdf, stripped[2:], 10)
-            pdf.ln(4)
-        elif stripped == "---":
-            pdf.ln(2)
-            pdf.set_draw_color(200, 200, 200)
-            pdf.line(pdf.l_margin, pdf.get_y(), 200, pdf.get_y())
-            pdf.ln(4)
-        elif stripped.startswith("|"):
-            pdf.set_font("Helvetica", "", 9)
-            cells = [c.strip() for c in stripped.strip("|").split("|")]
-            if all(c.replace("-", "").strip() == "" for c in cells):
-                continue  # skip separator row |---|---|
-            col_w = 180 / max(len(cells), 1)
-            for cell in cells:
-                pdf.cell(col_w, 7, clean(cell[:50]), border=1)
-            pdf.ln()
-            pdf.set_x(pdf.l_margin)
-        elif stripped.startswith(("- ", "* ")):
-            pdf.set_font("Helvetica", "", 11)
-            pdf.set_x(pdf.l_margin + 2)
-            safe_multicell(pdf, "- " + clean(stripped[2:]), 7, 88)
-        elif len(stripped) > 2 and stripped[0].isdigit() and stripped[1] in ".)" :
-            pdf.set_font("Helvetica", "", 11)
-            safe_multicell(pdf, stripped)
-        elif stripped:
-            pdf.set_font("Helvetica", "", 11)
-            safe_multicell(pdf, stripped, 7)
+
+    # Render now so the first download is served straight from GridFS. Best effort —
+    # a busy or failing renderer doesn't fail the compile; the download renders instead.
+    try:
+        await _ensure_pdf(db, {**doc, "session_id": session_id, "compiled_content": final_content,
+                               "doc_title": doc_title, "blocks": blocks, "ast_version": AST_VERSION}, digest)
+    except HTTPException as e:
+        logger.warning(f"PDF pre-render for {session_id} skipped ({e.status_code}): {e.detail}")
+
+    return {"message": "Document compiled", "document_id": doc["_id"], "doc_title": doc_title,
+            "pdf_etag": digest}
+
+# In-flight renders keyed by (session_id, content hash) — concurrent compiles and
+# downloads of the same content share one render instead of each storing a file
+_pdf_renders: dict[tuple, asyncio.Task] = {}
+
+async def _render_pdf(db, doc: dict, digest: str) -> dict:
+    # Re-read the pointer — a render that finished since `doc` was read makes this one unnecessary
+    projection = {"pdf": 1} if "blocks" in doc else {"pdf": 1, "blocks": 1, "ast_version": 1}
+    current    = await db.generated_documents.find_one({"session_id": doc["session_id"]}, projection) or {}
+    if current.get("pdf", {}).get("hash") == digest:
+        return current["pdf"]
+    doc       = {**doc, **current}
+    pdf_bytes = await pdf_renderer.render(document_blocks(doc), doc.get("doc_title", "Document"))
+    return await store_pdf(db, doc["session_id"], digest, pdf_bytes)
+
+async def _ensure_pdf(db, doc: dict, digest: str) -> dict:
+    """Stored PDF info for a compiled document, rendering it first (on the PDF process pool) if missing or stale."""
+    if doc.get("pdf", {}).get("hash") == digest:
+        return doc["pdf"]
+    key  = (doc["session_id"], digest)
+    task = _pdf_renders.get(key)
+    if task is None:
+        task = _pdf_renders[key] = asyncio.create_task(_render_pdf(db, doc, digest))
+        task.add_done_callback(lambda _: _pdf_renders.pop(key, None))
+    # Shielded — a client hanging up doesn't cancel the render others are waiting on
+    return await asyncio.shield(task)
+
+
+def _parse_range(header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """
+    (start, end) inclusive for a single `bytes=` range, None to send the whole file.
+    Raises 416 when the range is outside the file. Multi-range requests get the whole file.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[6:].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end   = min(int(last), size - 1) if last else size - 1
         else:
-            pdf.ln(4)
-    return pdf.output()
+            start = max(size - int(last), 0)   # suffix range: last N bytes
+            end   = size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
 
 # ─── Download PDF ───────────────────────────────────────────────
 @router.get("/{session_id}/download_pdf")
-def download_pdf(session_id: str):
-    db           = get_db()
-    compiled_doc = db.generated_documents.find_one({"session_id": session_id})
+async def download_pdf(session_id: str, request: Request):
+    """
+    Stream the compiled document's PDF from GridFS. It is rendered at compile
+    time; a download only renders when that failed or the renderer changed.
+
+    ETag is the content hash recorded at compile, so If-None-Match answers 304
+    without rendering or reading the file, and Range / If-Range allow resumed downloads.
+    """
+    db           = get_async_db()
+    compiled_doc = await db.generated_documents.find_one(
+        {"session_id": session_id},
+        {"session_id": 1, "compiled_content": 1, "doc_title": 1, "pdf": 1, "content_hash": 1, "pdf_renderer": 1},
+    )
     if not compiled_doc:
         raise HTTPException(status_code=404, detail="Compiled document not found")
 
@@ -513,54 +819,48 @@ def download_pdf(session_id: str):
     doc_title = compiled_doc.get("doc_title", "Document")
     safe_filename = "".join(c if c.isalnum() or c in "._- " else "_" for c in doc_title).strip()
 
-    pdf_bytes = render_markdown_to_pdf(content, doc_title)
-    buf = BytesIO(pdf_bytes)
-    buf.seek(0)
+    # Documents compiled before content_hash, or under an older RENDERER_VERSION, hash it here
+    digest = compiled_doc.get("content_hash")
+    if not digest or compiled_doc.get("pdf_renderer") != RENDERER_VERSION:
+        digest = pdf_hash(content, doc_title)
+    etag = f'"{digest}"'
+    headers = {
+        "ETag":                etag,
+        "Accept-Ranges":       "bytes",
+        "Cache-Control":       "private, no-cache",   # revalidate every time — 304 is cheap
+        "Content-Disposition": f'attachment; filename="{safe_filename}.pdf"',
+    }
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [t.strip().removeprefix("W/") for t in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+
+    pdf = await _ensure_pdf(db, compiled_doc, digest)
+
+    size       = pdf["size"]
+    byte_range = None
+    if request.headers.get("if-range", etag) == etag:
+        byte_range = _parse_range(request.headers.get("range"), size)
+
+    if byte_range is None:
+        return StreamingResponse(
+            iter_pdf(db, pdf["file_id"]),
+            media_type="application/pdf",
+            headers={**headers, "Content-Length": str(size)},
+        )
+
+    start, end = byte_range
     return StreamingResponse(
-        buf,
+        iter_pdf(db, pdf["file_id"], start, end),
+        status_code=206,
         media_type="application/pdf",
-        headers={"Content-Disposition": f'attachment; filename="{safe_filename}.pdf"'}
+        headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(end - start + 1)},
     )
 
 
 # NOTION HELPERS
 
 
-def _notion_headers() -> dict:
-    return {
-        "Authorization":  f"Bearer {NOTION_API_KEY}",
-        "Notion-Version": NOTION_VERSION,
-        "Content-Type":   "application/json",
-    }
-
-def _notion_request(method: str, url: str, payload: dict) -> dict:
-    """Make a Notion API call with exponential backoff on 429."""
-    for attempt in range(MAX_RETRIES):
-        try:
-            resp = http_requests.request(
-                method, url,
-                headers=_notion_headers(),
-                json=payload,
-                timeout=30,
-            )
-            if resp.status_code == 429:
-                wait = BACKOFF_BASE_SEC * (2 ** attempt)
-                time.sleep(wait)
-                continue
-            resp.raise_for_status()
-            return resp.json()
-        except http_requests.exceptions.Timeout:
-            if attempt == MAX_RETRIES - 1:
-                raise HTTPException(status_code=504, detail="Notion API timed out")
-            time.sleep(BACKOFF_BASE_SEC * (2 ** attempt))
-        except http_requests.exceptions.HTTPError as e:
-            detail = ""
-            try:    detail = e.response.json().get("message", str(e))
-            except: detail = str(e)
-            raise HTTPException(status_code=502, detail=f"Notion API error: {detail}")
-    raise HTTPException(status_code=502, detail="Notion API failed after max retries")
-
-
 def _chunk_text(text: str) -> list:
     """Split text into chunks of max RICH_TEXT_MAX_CHARS on word boundaries."""
     if len(text) <= RICH_TEXT_MAX_CHARS:
@@ -578,79 +878,39 @@ def _chunk_text(text: str) -> list:
     return chunks
 
 
-def _make_rich_text(text: str) -> list:
-    """Convert a plain string into a Notion rich_text array, handling bold."""
-    if not text.strip():
-        return [{"type": "text", "text": {"content": ""}}]
-
-    rich = []
-    # Parse **bold** segments
-    parts = re.split(r"(\*\*.*?\*\*)", text)
-    for part in parts:
-        if part.startswith("**") and part.endswith("**"):
-            inner = part[2:-2]
-            for chunk in _chunk_text(inner):
-                rich.append({
-                    "type": "text",
-                    "text": {"content": chunk},
-                    "annotations": {"bold": True},
-                })
-        else:
-            for chunk in _chunk_text(part):
-                if chunk:
-                    rich.append({"type": "text", "text": {"content": chunk}})
-    return rich if rich else [{"type": "text", "text": {"content": ""}}]
+_EMPTY_RICH_TEXT = [{"type": "text", "text": {"content": ""}}]
 
 
-def _make_paragraph(text: str) -> dict:
-    return {"object": "block", "type": "paragraph",
-            "paragraph": {"rich_text": _make_rich_text(text)}}
-
-def _make_heading2(text: str) -> dict:
-    return {"object": "block", "type": "heading_2",
-            "heading_2": {"rich_text": _make_rich_text(text)}}
-
-def _make_heading3(text: str) -> dict:
-    return {"object": "block", "type": "heading_3",
-            "heading_3": {"rich_text": _make_rich_text(text)}}
+def _make_rich_text(spans_: list) -> list:
+    """Convert tokenizer spans into a Notion rich_text array, keeping bold."""
+    rich = []
+    for span in spans_:
+        for chunk in _chunk_text(span["text"]):
+            if not chunk:
+                continue
+            item = {"type": "text", "text": {"content": chunk}}
+            if span["bold"]:
+                item["annotations"] = {"bold": True}
+            rich.append(item)
+    return rich if rich else list(_EMPTY_RICH_TEXT)
 
-def _make_bullet(text: str) -> dict:
-    return {"object": "block", "type": "bulleted_list_item",
-            "bulleted_list_item": {"rich_text": _make_rich_text(text)}}
 
-def _make_numbered(text: str) -> dict:
-    return {"object": "block", "type": "numbered_list_item",
-            "numbered_list_item": {"rich_text": _make_rich_text(text)}}
+def _make_text_block(block_type: str, spans_: list) -> dict:
+    return {"object": "block", "type": block_type,
+            block_type: {"rich_text": _make_rich_text(spans_)}}
 
 def _make_divider() -> dict:
     return {"object": "block", "type": "divider", "divider": {}}
 
 
-def _parse_table(table_lines: list) -> dict:
-    """Convert markdown table lines into a Notion table block."""
-    rows = []
-    for line in table_lines:
-        # Skip separator rows like |---|---|
-        stripped = line.strip().strip("|")
-        if re.match(r"^[\s\-:|]+$", stripped):
-            continue
-        cells = [c.strip() for c in line.strip().strip("|").split("|")]
-        rows.append(cells)
-
-    if not rows:
-        return None
-
+def _make_table(rows: list) -> dict:
+    """Convert tokenizer table rows into a Notion table block."""
     table_width = max(len(r) for r in rows)
 
-    # Pad all rows to same width
-    padded_rows = [r + [""] * (table_width - len(r)) for r in rows]
-
     children = []
-    for i, row in enumerate(padded_rows):
-        cells = []
-        for cell in row:
-            cells.append(_make_rich_text(cell) if cell.strip() else
-                         [{"type": "text", "text": {"content": ""}}])
+    for row in rows:
+        # Pad all rows to same width
+        cells = [_make_rich_text(cell) for cell in row] + [list(_EMPTY_RICH_TEXT)] * (table_width - len(row))
         children.append({
             "object": "block",
             "type":   "table_row",
@@ -669,159 +929,320 @@ def _parse_table(table_lines: list) -> dict:
     }
 
 
-def _content_to_blocks(compiled_content: str) -> list:
+# Markdown heading level -> Notion block type (Notion has no H1 inside a page body here)
+_NOTION_HEADINGS = {1: "heading_2", 2: "heading_2", 3: "heading_3"}
+_NOTION_TEXT_BLOCKS = {"paragraph": "paragraph", "bullet": "bulleted_list_item", "numbered": "numbered_list_item"}
+
+
+def _content_to_blocks(blocks) -> list:
+    """
+    Convert the compiled document's markdown AST (services/markdown_blocks.py)
+    into a flat list of Notion blocks. Blank lines only matter to the PDF.
     """
-    Convert DocForge compiled markdown content into a flat list of Notion blocks.
-    Handles: headings, paragraphs, bullets, numbered lists, tables, dividers.
+    notion_blocks = []
+    for block in blocks:
+        kind = block["type"]
+        if kind == "heading":
+            notion_blocks.append(_make_text_block(_NOTION_HEADINGS[block["level"]], block["spans"]))
+        elif kind in _NOTION_TEXT_BLOCKS:
+            notion_blocks.append(_make_text_block(_NOTION_TEXT_BLOCKS[kind], block["spans"]))
+        elif kind == "table":
+            notion_blocks.append(_make_table(block["rows"]))
+        elif kind == "divider":
+            notion_blocks.append(_make_divider())
+    return notion_blocks
+
+
+async def _append_blocks(page_id: str, blocks: list, on_batch=None) -> None:
     """
-    blocks = []
-    sections = compiled_content.split("\n\n---\n\n")
+    Append blocks to a Notion page in batches of MAX_BLOCKS_PER_REQUEST.
+    await on_batch(n) is called after each successful batch with the number of blocks sent.
+    """
+    path = f"/blocks/{page_id}/children"
+    for batch_start in range(0, len(blocks), MAX_BLOCKS_PER_REQUEST):
+        batch = blocks[batch_start : batch_start + MAX_BLOCKS_PER_REQUEST]
+        await notion_client.request("PATCH", path, {"children": batch})
+        if on_batch:
+            await on_batch(len(batch))
 
-    for sec_idx, section in enumerate(sections):
-        lines = section.strip().split("\n")
-        if not lines:
-            continue
 
-        # Add divider between sections (not before first)
-        if sec_idx > 0:
-            blocks.append(_make_divider())
+# ─── Incremental republish ─────────────────────────────────────
+# Block types whose text can be edited in place with PATCH /blocks/{id}.
+# Tables and dividers are replaced (delete + insert) instead.
+PATCHABLE_BLOCK_TYPES = {"paragraph", "heading_2", "heading_3", "bulleted_list_item", "numbered_list_item"}
+# Notion answers these when a stored block id no longer matches the page (deleted or archived by hand)
+STALE_BLOCK_STATUS = {404, 409}
 
-        i = 0
-        while i < len(lines):
-            line = lines[i]
-            stripped = line.strip()
 
-            # ── Skip empty lines ──────────────────────────────
-            if not stripped:
-                i += 1
-                continue
+def _block_hash(block: dict) -> str:
+    return hashlib.sha256(json.dumps(block, sort_keys=True, ensure_ascii=False).encode()).hexdigest()[:20]
 
-            # ── Horizontal rule ───────────────────────────────
-            if stripped in ("---", "***", "___"):
-                blocks.append(_make_divider())
-                i += 1
-                continue
 
-            # ── Table detection ───────────────────────────────
-            if stripped.startswith("|"):
-                table_lines = []
-                while i < len(lines) and lines[i].strip().startswith("|"):
-                    table_lines.append(lines[i])
-                    i += 1
-                tbl = _parse_table(table_lines)
-                if tbl:
-                    blocks.append(tbl)
-                continue
+def _block_index(block_ids: list, blocks: list) -> list:
+    """What notion_publishes stores per top-level block so the next republish can diff against it."""
+    return [{"id": bid, "type": b["type"], "hash": _block_hash(b)} for bid, b in zip(block_ids, blocks)]
 
-            # ── Headings ──────────────────────────────────────
-            if stripped.startswith("### "):
-                blocks.append(_make_heading3(stripped[4:].strip()))
-                i += 1
-                continue
-            if stripped.startswith("## "):
-                blocks.append(_make_heading2(stripped[3:].strip()))
-                i += 1
-                continue
-            if stripped.startswith("# "):
-                blocks.append(_make_heading2(stripped[2:].strip()))
-                i += 1
-                continue
 
-            # ── Bullet list ───────────────────────────────────
-            if stripped.startswith("- ") or stripped.startswith("* "):
-                blocks.append(_make_bullet(stripped[2:].strip()))
-                i += 1
-                continue
+async def _list_child_ids(block_id: str) -> list:
+    """Ids of every top-level child of a Notion block or page, in order."""
+    ids, cursor = [], None
+    while True:
+        path = f"/blocks/{block_id}/children?page_size=100"
+        if cursor:
+            path += f"&start_cursor={cursor}"
+        result = await notion_client.request("GET", path)
+        ids += [b["id"] for b in result.get("results", [])]
+        if not result.get("has_more"):
+            return ids
+        cursor = result.get("next_cursor")
 
-            # ── Numbered list ─────────────────────────────────
-            num_match = re.match(r"^\d+[.)]\s+(.*)", stripped)
-            if num_match:
-                blocks.append(_make_numbered(num_match.group(1).strip()))
-                i += 1
-                continue
 
-            # ── Normal paragraph ──────────────────────────────
-            blocks.append(_make_paragraph(stripped))
-            i += 1
+async def _insert_blocks(page_id: str, blocks: list, after: Optional[str]) -> list:
+    """Insert blocks after block `after` (page end when None). Returns the new block ids."""
+    ids  = []
+    path = f"/blocks/{page_id}/children"
+    for batch_start in range(0, len(blocks), MAX_BLOCKS_PER_REQUEST):
+        batch   = blocks[batch_start : batch_start + MAX_BLOCKS_PER_REQUEST]
+        payload = {"children": batch}
+        if after:
+            payload["after"] = after
+        result  = await notion_client.request("PATCH", path, payload)
+        new_ids = [b["id"] for b in result.get("results", [])]
+        if len(new_ids) != len(batch):
+            # Response did not list exactly the new blocks — locate them on the page instead
+            children = await _list_child_ids(page_id)
+            pos      = children.index(after) + 1 if after else len(children) - len(batch)
+            new_ids  = children[pos : pos + len(batch)]
+        ids  += new_ids
+        after = new_ids[-1]
+    return ids
+
+
+async def _diff_page_blocks(page_id: str, old_index: list, blocks: list, on_change) -> tuple[list, dict]:
+    """
+    Bring an existing Notion page from old_index to blocks with as few calls as possible.
 
-    return blocks
+    Unchanged blocks (same hash) are left alone, changed text blocks are patched
+    in place, everything else is deleted or inserted after its new predecessor.
+    Notion can only insert *after* a block, so a change in front of the first
+    block rewrites the page body. The page id never changes.
+    Returns (new block ids, change counts).
+    """
+    stats   = {"unchanged": 0, "updated": 0, "inserted": 0, "deleted": 0}
+    old_ids = [b["id"] for b in old_index]
+    opcodes = difflib.SequenceMatcher(
+        None, [b["hash"] for b in old_index], [_block_hash(b) for b in blocks], autojunk=False,
+    ).get_opcodes()
+
+    def patchable(old: dict, new: dict) -> bool:
+        return old["type"] == new["type"] and new["type"] in PATCHABLE_BLOCK_TYPES
+
+    tag, i1, _, j1, _ = opcodes[0] if opcodes else ("equal", 0, 0, 0, 0)
+    if old_index and (tag == "insert" or (tag == "replace" and not patchable(old_index[i1], blocks[j1]))):
+        for bid in old_ids:
+            await notion_client.request("DELETE", f"/blocks/{bid}")
+            await on_change()
+        new_ids = await _insert_blocks(page_id, blocks, None)
+        await on_change(len(blocks))
+        return new_ids, {**stats, "deleted": len(old_ids), "inserted": len(blocks), "rewritten": True}
+
+    new_ids: list = []
+    pending: list = []   # new blocks waiting to be inserted after new_ids[-1]
+
+    async def flush() -> None:
+        if pending:
+            new_ids.extend(await _insert_blocks(page_id, pending, new_ids[-1] if new_ids else None))
+            stats["inserted"] += len(pending)
+            await on_change(len(pending))
+            pending.clear()
+
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "equal":
+            new_ids.extend(old_ids[i1:i2])
+            stats["unchanged"] += i2 - i1
+            continue
+        olds, news = old_index[i1:i2], blocks[j1:j2]
+        for k in range(max(len(olds), len(news))):
+            old = olds[k] if k < len(olds) else None
+            new = news[k] if k < len(news) else None
+            if old and new and patchable(old, new):
+                await flush()
+                await notion_client.request("PATCH", f"/blocks/{old['id']}", {new["type"]: new[new["type"]]})
+                new_ids.append(old["id"])
+                stats["updated"] += 1
+                await on_change()
+                continue
+            if old:
+                await notion_client.request("DELETE", f"/blocks/{old['id']}")
+                stats["deleted"] += 1
+                await on_change()
+            if new:
+                pending.append(new)
+        await flush()
 
+    return new_ids, stats
 
-def _append_blocks(page_id: str, blocks: list) -> None:
-    """Append blocks to a Notion page in batches of MAX_BLOCKS_PER_REQUEST."""
-    url = f"{NOTION_BASE_URL}/blocks/{page_id}/children"
-    for batch_start in range(0, len(blocks), MAX_BLOCKS_PER_REQUEST):
-        batch = blocks[batch_start : batch_start + MAX_BLOCKS_PER_REQUEST]
-        _notion_request("PATCH", url, {"children": batch})
-        if batch_start + MAX_BLOCKS_PER_REQUEST < len(blocks):
-            time.sleep(REQUEST_INTERVAL_SEC)
 
+async def _rewrite_page_blocks(page_id: str, blocks: list, on_change) -> tuple[list, dict]:
+    """
+    Replace every top-level block the page has now with blocks — the fallback when the
+    stored block index no longer matches the page. Returns (new block ids, change counts).
+    """
+    old_ids = await _list_child_ids(page_id)
+    for bid in old_ids:
+        try:
+            await notion_client.request("DELETE", f"/blocks/{bid}")
+        except NotionAPIError as e:
+            if e.notion_status not in STALE_BLOCK_STATUS:
+                raise
+    new_ids = await _insert_blocks(page_id, blocks, None)
+    await on_change(len(blocks))
+    return new_ids, {"unchanged": 0, "updated": 0, "inserted": len(blocks), "deleted": len(old_ids), "rewritten": True}
+
+
+async def _live_page(page_id: str) -> bool:
+    """False when the previously published page was deleted or archived in Notion."""
+    try:
+        page = await notion_client.request("GET", f"/pages/{page_id}")
+    except HTTPException:
+        return False
+    return not (page.get("archived") or page.get("in_trash"))
+
+
+async def _publish_to_notion(progress: JobProgress, session_id: str, requested_title: Optional[str],
+                             mode: str = "new") -> dict:
+    """
+    Background job body for publish_notion.
 
-# ─── Publish to Notion ─────────────────────────────────────────
-@router.post("/{session_id}/publish_notion")
-def publish_notion(session_id: str, payload: PublishRequest):
-    db = get_db()
+    mode "new" creates a page and uploads every block. mode "update" diffs
+    against the block hashes stored with the last publish and patches that
+    page in place; it falls back to "new" when there is no usable page. When
+    blocks were changed by hand in Notion and the diff hits a stale block id,
+    the page body is rewritten instead, or a new page published if that fails too.
+    """
+    db = get_async_db()
 
-    # ── Get compiled document ──────────────────────────────────
-    compiled_doc = db.generated_documents.find_one({"session_id": session_id})
+    compiled_doc = await db.generated_documents.find_one({"session_id": session_id})
     if not compiled_doc:
         raise HTTPException(status_code=404, detail="Compiled document not found")
 
-    content = compiled_doc.get("compiled_content", "")
-    if not content.strip():
-        raise HTTPException(status_code=400, detail="Document content is empty")
-
     # ── Get session + template info ────────────────────────────
-    session  = db.doc_sessions.find_one({"_id": session_id})
+    session  = await db.doc_sessions.find_one({"_id": session_id})
     dept_id  = session.get("dept_id", "") if session else ""
-    template = db.document_templates.find_one(
-        {"_id": session.get("template_id", "")}
-    ) if session else None
+    template = await aget_template(db, session.get("template_id", "")) if session else None
 
-    doc_title = (payload.doc_title or compiled_doc.get("doc_title", "Document")).strip()
-    tags      = (template.get("label") or template.get("doc_name", "")) if template else doc_title
+    doc_title = (requested_title or compiled_doc.get("doc_title", "Document")).strip()
+    tags      = (template.template.get("label") or template.template.get("doc_name", "")) if template else doc_title
     industry  = DEPT_MAP.get(dept_id, dept_id.replace("_", " ").title() if dept_id else "General")
 
     # ── Version tracking ───────────────────────────────────────
-    existing = db.notion_publishes.count_documents({"session_id": session_id})
+    existing = await db.notion_publishes.count_documents({"session_id": session_id})
     version  = f"v{existing + 1}"
 
-    # ── Convert content to Notion blocks ──────────────────────
-    all_blocks = _content_to_blocks(content)
-
-    # First batch goes in the page creation call (max 95)
-    first_batch    = all_blocks[:MAX_BLOCKS_PER_REQUEST]
-    remaining      = all_blocks[MAX_BLOCKS_PER_REQUEST:]
-
-    # ── Create Notion page with properties + first batch ──────
-    page_payload = {
-        "parent": {"database_id": NOTION_DATABASE_ID},
-        "properties": {
-            "Name":     {"title":  [{"text": {"content": doc_title}}]},
-            "industry": {"rich_text": [{"text": {"content": industry}}]},
-            "version":  {"rich_text": [{"text": {"content": version}}]},
-            "tags":     {"rich_text": [{"text": {"content": tags}}]},
-        },
-        "children": first_batch,
+    properties = {
+        "Name":     {"title":  [{"text": {"content": doc_title}}]},
+        "industry": {"rich_text": [{"text": {"content": industry}}]},
+        "version":  {"rich_text": [{"text": {"content": version}}]},
+        "tags":     {"rich_text": [{"text": {"content": tags}}]},
     }
 
-    time.sleep(REQUEST_INTERVAL_SEC)
-    page = _notion_request("POST", f"{NOTION_BASE_URL}/pages", page_payload)
-    page_id  = page["id"]
-    page_url = page.get("url", f"https://www.notion.so/{page_id.replace('-', '')}")
+    # ── Convert content to Notion blocks ──────────────────────
+    all_blocks = _content_to_blocks(document_blocks(compiled_doc))
+
+    last = None
+    if mode == "update":
+        last = await db.notion_publishes.find_one(
+            {"session_id": session_id, "block_index": {"$exists": True}},
+            sort=[("published_at", -1)],
+        )
+        if last and not await _live_page(last["notion_page_id"]):
+            last = None
+
+    if last:
+        # ── Patch the last published page in place ────────────
+        old_index = last["block_index"]
+        page_id   = last["notion_page_id"]
+        total     = sum(
+            max(i2 - i1, j2 - j1)
+            for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(
+                None, [b["hash"] for b in old_index], [_block_hash(b) for b in all_blocks], autojunk=False,
+            ).get_opcodes() if tag != "equal"
+        )
+        done = 0
+        await progress.aupdate(blocks_sent=done, blocks_total=total)
 
-    # ── Append remaining blocks in batches ────────────────────
-    if remaining:
-        time.sleep(REQUEST_INTERVAL_SEC)
-        _append_blocks(page_id, remaining)
+        async def on_change(n: int = 1) -> None:
+            nonlocal done
+            done = min(done + n, total)
+            await progress.aupdate(blocks_sent=done, blocks_total=total)
+
+        try:
+            block_ids, changes = await _diff_page_blocks(page_id, old_index, all_blocks, on_change)
+        except NotionAPIError as e:
+            if e.notion_status not in STALE_BLOCK_STATUS:
+                raise
+            logger.warning(f"Notion page {page_id} no longer matches its block index ({e.detail}) — rewriting it")
+            done, total = 0, len(all_blocks)
+            await progress.aupdate(blocks_sent=done, blocks_total=total)
+            try:
+                block_ids, changes = await _rewrite_page_blocks(page_id, all_blocks, on_change)
+            except NotionAPIError as e:
+                if e.notion_status not in STALE_BLOCK_STATUS:
+                    raise
+                logger.warning(f"Rewriting Notion page {page_id} failed ({e.detail}) — publishing a new page")
+                last = None
+
+    if last:
+        page     = await notion_client.request("PATCH", f"/pages/{page_id}", {"properties": properties})
+        page_url = page.get("url", last.get("notion_url"))
+        mode     = "update"
+    else:
+        sent = 0
+        await progress.aupdate(blocks_sent=sent, blocks_total=len(all_blocks))
+
+        # First batch goes in the page creation call (max 95)
+        first_batch    = all_blocks[:MAX_BLOCKS_PER_REQUEST]
+        remaining      = all_blocks[MAX_BLOCKS_PER_REQUEST:]
+
+        # ── Create Notion page with properties + first batch ──
+        page_payload = {
+            "parent":     {"database_id": NOTION_DATABASE_ID},
+            "properties": properties,
+            "children":   first_batch,
+        }
+
+        page = await notion_client.request("POST", "/pages", page_payload)
+        page_id  = page["id"]
+        page_url = page.get("url", f"https://www.notion.so/{page_id.replace('-', '')}")
+        sent += len(first_batch)
+        await progress.aupdate(blocks_sent=sent, blocks_total=len(all_blocks))
+
+        # ── Append remaining blocks in batches ────────────────
+        async def on_batch(n: int) -> None:
+            nonlocal sent
+            sent += n
+            await progress.aupdate(blocks_sent=sent, blocks_total=len(all_blocks))
+
+        if remaining:
+            await _append_blocks(page_id, remaining, on_batch)
+
+        # Block ids let the next "update" publish diff against this one
+        block_ids = await _list_child_ids(page_id)
+        changes   = {"inserted": len(all_blocks)}
+        mode      = "new"
+
+    # Visible in the library right away, not after the next mirror refresh
+    await notion_mirror.upsert_page(page)
 
     # ── Store publish record ───────────────────────────────────
-    db.notion_publishes.insert_one({
+    await db.notion_publishes.insert_one({
         "session_id":   session_id,
         "doc_title":    doc_title,
         "version":      version,
+        "mode":         mode,
         "notion_page_id": page_id,
         "notion_url":   page_url,
+        "block_index":  _block_index(block_ids, all_blocks),
         "published_at": datetime.utcnow(),
     })
 
@@ -832,4 +1253,33 @@ def publish_notion(session_id: str, payload: PublishRequest):
         "industry":   industry,
         "tags":       tags,
         "notion_url": page_url,
-    }
\ No newline at end of file
+        "mode":       mode,
+        "changes":    changes,
+    }
+
+
+# ─── Publish to Notion ─────────────────────────────────────────
+@router.post("/{session_id}/publish_notion", status_code=202)
+async def publish_notion(session_id: str, payload: PublishRequest):
+    """Queue a Notion publish and return its job id at once — poll GET /jobs/{job_id}."""
+    db = get_async_db()
+
+    # ── Validate up front so obvious errors are not deferred to the job ──
+    compiled_doc = await db.generated_documents.find_one({"session_id": session_id}, {"compiled_content": 1})
+    if not compiled_doc:
+        raise HTTPException(status_code=404, detail="Compiled document not found")
+
+    content = compiled_doc.get("compiled_content", "")
+    if not content.strip():
+        raise HTTPException(status_code=400, detail="Document content is empty")
+
+    job_id = await job_queue.submit(
+        "notion_publish", _publish_to_notion, session_id, payload.doc_title, payload.mode,
+        session_id=session_id,
+    )
+    return {
+        "message":  "Publish queued",
+        "job_id":   job_id,
+        "status":   "queued",
+        "poll_url": f"/jobs/{job_id}",
+    }
@@ -2,7 +2,7 @@ import json
 import logging
 from fastapi import APIRouter, Query
 from app.db import get_db
-from app.redis_client import get_redis, CACHE_TTL
+from app.redis_client import get_redis, l1_cache, CACHE_TTL
 
 logger = logging.getLogger("docforge.templates")
 router = APIRouter(prefix="/templates", tags=["Templates"])
@@ -13,13 +13,20 @@ def get_templates(dept_id: str = Query(...)):
     r = get_redis()
     cache_key = f"docforge:templates:{dept_id}"
 
-    # ── Try cache first ───────────────────────────────────────
+    # ── In-process L1 first — no network, no json.loads ───────
+    local = l1_cache.get(cache_key)
+    if local is not None:
+        return local
+
+    # ── Then Redis ────────────────────────────────────────────
     if r:
         try:
             cached = r.get(cache_key)
             if cached:
                 logger.info(f"templates: cache hit for {dept_id}")
-                return json.loads(cached)
+                value = json.loads(cached)
+                l1_cache.set(cache_key, value)
+                return value
         except Exception as e:
             logger.warning(f"Redis read failed: {e}")
 
@@ -38,4 +45,6 @@ def get_templates(dept_id: str = Query(...)):
         except Exception as e:
             logger.warning(f"Redis write failed: {e}")
 
+    l1_cache.set(cache_key, templates)
+
     return templates
\ No newline at end of file
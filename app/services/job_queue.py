@@ -0,0 +1,179 @@
+import asyncio
+import inspect
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+
+from fastapi import HTTPException
+
+from app.config import settings
+from app.db import get_db, get_async_db
+
+logger = logging.getLogger("docforge.jobs")
+
+
+class JobProgress:
+    """Handed to every job function so it can report progress while it runs."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+
+    def update(self, **progress) -> None:
+        """For sync jobs running on the job thread pool."""
+        get_db().jobs.update_one(
+            {"_id": self.job_id},
+            {"$set": {"progress": progress, "updated_at": datetime.utcnow()}},
+        )
+
+    async def aupdate(self, **progress) -> None:
+        """For async jobs running on the event loop."""
+        await get_async_db().jobs.update_one(
+            {"_id": self.job_id},
+            {"$set": {"progress": progress, "updated_at": datetime.utcnow()}},
+        )
+
+
+class JobQueue:
+    """
+    Background job runner for slow, I/O-bound work such as Notion publishing.
+
+    Routes call `submit()` and return the job id straight away. A fixed set
+    of asyncio workers pulls jobs off an in-process queue; coroutine job
+    functions are awaited on the event loop, plain functions run on a
+    dedicated thread pool, so long jobs never occupy FastAPI's own request
+    threadpool. At most `workers` jobs run at once. Job state and progress
+    live in the Mongo `jobs` collection, so any API worker can answer
+    GET /jobs/{id}.
+
+    Queued jobs are held in memory — jobs still queued when the process
+    stops are not resumed. Each process heartbeats the jobs it owns by
+    touching `updated_at`; a queued or running job nobody has touched for
+    `stale_sec` belonged to a process that is gone and is marked failed, at
+    startup and on every heartbeat after it, so pollers never wait forever.
+    """
+
+    def __init__(self, workers: int, stale_sec: int):
+        self.workers   = workers
+        self.stale_sec = stale_sec
+        self.owner     = uuid.uuid4().hex   # this process — its jobs are heartbeated, not reaped
+        self._queue: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._executor: ThreadPoolExecutor | None = None
+
+    def start(self) -> None:
+        if self._queue is not None:
+            return
+        self._queue    = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="docforge-job")
+        self._tasks    = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._queue, self._tasks, self._executor = None, [], None
+
+    async def submit(self, job_type: str, fn, *args, **meta) -> str:
+        """
+        Record a queued job and schedule `fn(progress, *args)`.
+
+        `fn` returns the job result (stored on the job document) or raises;
+        extra keyword arguments are stored on the job for filtering.
+        """
+        self.start()
+        job_id = f"job_{uuid.uuid4().hex[:12]}"
+        now    = datetime.utcnow()
+        await get_async_db().jobs.insert_one({
+            "_id":        job_id,
+            "type":       job_type,
+            "status":     "queued",
+            "progress":   {},
+            "result":     None,
+            "error":      None,
+            "created_at": now,
+            "updated_at": now,
+            "owner":      self.owner,
+            **meta,
+        })
+        await self._queue.put((job_id, fn, args))
+        return job_id
+
+    async def _set(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = datetime.utcnow()
+        await get_async_db().jobs.update_one({"_id": job_id}, {"$set": fields})
+
+    async def fail_orphans(self) -> int:
+        """Fail queued/running jobs of other processes not heartbeated for stale_sec. Returns how many."""
+        now    = datetime.utcnow()
+        result = await get_async_db().jobs.update_many(
+            {
+                "status":     {"$in": ["queued", "running"]},
+                "owner":      {"$ne": self.owner},
+                "updated_at": {"$lt": now - timedelta(seconds=self.stale_sec)},
+            },
+            {"$set": {"status": "failed", "error": "Interrupted — the API process running this job stopped",
+                      "updated_at": now, "finished_at": now}},
+        )
+        if result.modified_count:
+            logger.warning(f"Marked {result.modified_count} orphaned job(s) as failed")
+        return result.modified_count
+
+    async def _heartbeat(self) -> None:
+        while True:
+            try:
+                await self.fail_orphans()
+                await get_async_db().jobs.update_many(
+                    {"owner": self.owner, "status": {"$in": ["queued", "running"]}},
+                    {"$set": {"updated_at": datetime.utcnow()}},
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Job heartbeat failed: {e}")
+            await asyncio.sleep(self.stale_sec / 3)
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            job_id, fn, args = await self._queue.get()
+            try:
+                await self._set(job_id, status="running", started_at=datetime.utcnow())
+                if inspect.iscoroutinefunction(fn):
+                    result = await fn(JobProgress(job_id), *args)
+                else:
+                    result = await loop.run_in_executor(self._executor, partial(fn, JobProgress(job_id), *args))
+                await self._set(job_id, status="succeeded", result=result, finished_at=datetime.utcnow())
+            except asyncio.CancelledError:
+                raise
+            except HTTPException as e:
+                logger.error(f"Job {job_id} failed: {e.detail}")
+                await self._set(job_id, status="failed", error=str(e.detail), finished_at=datetime.utcnow())
+            except Exception as e:
+                logger.exception(f"Job {job_id} crashed")
+                await self._set(job_id, status="failed", error=str(e), finished_at=datetime.utcnow())
+            finally:
+                self._queue.task_done()
+
+
+job_queue = JobQueue(workers=settings.job_workers, stale_sec=settings.job_stale_sec)
+
+
+def job_view(job: dict) -> dict:
+    """Public shape of a job document for GET /jobs/{id}."""
+    return {
+        "job_id":      job["_id"],
+        "type":        job.get("type"),
+        "status":      job.get("status"),
+        "progress":    job.get("progress", {}),
+        "result":      job.get("result"),
+        "error":       job.get("error"),
+        "created_at":  job.get("created_at"),
+        "started_at":  job.get("started_at"),
+        "finished_at": job.get("finished_at"),
+        "updated_at":  job.get("updated_at"),
+    }
@@ -0,0 +1,94 @@
+"""
+Tolerant JSON extraction from LLM output.
+
+Even in JSON mode a response can arrive wrapped in prose or code fences,
+with trailing commas, or cut off at the token limit. salvage_json() walks
+the text once per candidate object, tracking strings and open brackets:
+
+  - text before the first `{` and after the matching `}` is ignored
+  - trailing commas before `]` / `}` are dropped
+  - on truncation (or a mismatched bracket) the text is cut back to the
+    last complete member or element and the open brackets are closed, so
+    `{"questions": [{...}, {...}, {"question_te` still yields the first two
+"""
+import json
+
+MAX_CANDIDATES = 8   # `{` positions tried before giving up — prose can contain braces too
+
+OK       = "ok"         # a complete object, possibly wrapped in prose or fences
+REPAIRED = "repaired"   # parsed after dropping trailing commas or a truncated tail
+FAILED   = "failed"
+
+
+def _scan(text: str, start: int) -> tuple[str | None, bool]:
+    """Balanced JSON text beginning at `start`, and whether it needed no repair."""
+    out:   list[str] = []
+    stack: list[str] = []           # expected closers
+    safe = None                      # (len(out), stack) at the last point the text could be closed
+    in_str = escaped = modified = False
+
+    for ch in text[start:]:
+        if in_str:
+            out.append(ch)
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_str = False
+            continue
+
+        if ch == '"':
+            in_str = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            out.append(ch)
+            safe = (len(out), tuple(stack))
+            continue
+        elif ch in "}]":
+            if not stack or ch != stack[-1]:
+                break
+            end = len(out)
+            while end and out[end - 1].isspace():
+                end -= 1
+            if end and out[end - 1] == ",":
+                del out[end - 1:]
+                modified = True
+            stack.pop()
+            out.append(ch)
+            if not stack:
+                return "".join(out), not modified
+            safe = (len(out), tuple(stack))
+            continue
+        elif ch == ",":
+            safe = (len(out), tuple(stack))
+        out.append(ch)
+
+    if safe is None:
+        return None, False
+    cut, open_ = safe
+    return "".join(out[:cut]).rstrip().rstrip(",") + "".join(reversed(open_)), False
+
+
+def salvage_json(text: str, key: str | None = None) -> tuple[dict | None, str]:
+    """
+    First JSON object in `text` (the first one containing `key`, when given)
+    and how it was obtained — OK, REPAIRED or FAILED.
+    """
+    fallback = None
+    start, tried = text.find("{"), 0
+    while start != -1 and tried < MAX_CANDIDATES:
+        tried += 1
+        candidate, clean = _scan(text, start)
+        if candidate is not None:
+            try:
+                value = json.loads(candidate)
+            except ValueError:
+                value = None
+            if isinstance(value, dict):
+                outcome = OK if clean else REPAIRED
+                if key is None or key in value:
+                    return value, outcome
+                fallback = fallback or (value, outcome)
+        start = text.find("{", start + 1)
+    return fallback or (None, FAILED)
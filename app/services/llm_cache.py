@@ -0,0 +1,116 @@
+import asyncio
+import hashlib
+import logging
+import time
+
+from app.config import settings
+from app.redis_client import STATE_PREFIX, get_redis
+from app.services.llm_routing import Route
+
+logger = logging.getLogger("docforge.llm_cache")
+
+KEY_PREFIX = "docforge:llm:resp:"
+INDEX_KEY  = "docforge:llm:index"   # sorted set: cache key -> last used (unix time)
+STATS_KEY  = f"{STATE_PREFIX}llm:cache:stats"   # hash: hits / misses / evictions — counters, survive /cache/bust
+
+
+class LLMResponseCache:
+    """
+    Content-addressed cache of raw LLM responses in Redis.
+
+    Keys are a SHA-256 of the rendered prompt plus every route setting that
+    shapes the answer (deployment, temperature, max_tokens) and JSON mode, so
+    any change to the prompt, the model or its output settings is a different
+    entry. Entries expire after `ttl` seconds and the
+    least recently used ones are evicted once more than `max_entries` exist.
+    Every Redis failure degrades to a cache miss — the LLM call still happens.
+    Async callers use aget()/aset(), which run the Redis round trips in a thread.
+    """
+
+    def __init__(self, ttl: int, max_entries: int):
+        self.ttl         = ttl
+        self.max_entries = max_entries
+
+    @staticmethod
+    def make_key(prompt: str, route: Route, json_mode: bool) -> str:
+        parts  = (route.deployment, route.temperature, route.max_tokens, json_mode, prompt)
+        digest = hashlib.sha256("\x00".join(map(str, parts)).encode("utf-8")).hexdigest()
+        return f"{KEY_PREFIX}{digest}"
+
+    def get(self, prompt: str, route: Route, json_mode: bool) -> str | None:
+        r = get_redis()
+        if not r:
+            return None
+        key = self.make_key(prompt, route, json_mode)
+        try:
+            cached = r.get(key)
+            pipe = r.pipeline()
+            if cached is not None:
+                pipe.zadd(INDEX_KEY, {key: time.time()})
+                pipe.hincrby(STATS_KEY, "hits", 1)
+            else:
+                pipe.hincrby(STATS_KEY, "misses", 1)
+            pipe.execute()
+            return cached
+        except Exception as e:
+            logger.warning(f"LLM cache read failed: {e}")
+            return None
+
+    def set(self, prompt: str, route: Route, json_mode: bool, response: str) -> None:
+        r = get_redis()
+        if not r:
+            return
+        key = self.make_key(prompt, route, json_mode)
+        now = time.time()
+        try:
+            pipe = r.pipeline()
+            pipe.setex(key, self.ttl, response)
+            pipe.zadd(INDEX_KEY, {key: now})
+            # Entries untouched for a full TTL have already expired in Redis
+            pipe.zremrangebyscore(INDEX_KEY, 0, now - self.ttl)
+            pipe.zcard(INDEX_KEY)
+            size = pipe.execute()[-1]
+
+            overflow = size - self.max_entries
+            if overflow > 0:
+                evicted = [k for k, _ in r.zpopmin(INDEX_KEY, overflow)]
+                if evicted:
+                    pipe = r.pipeline()
+                    pipe.delete(*evicted)
+                    pipe.hincrby(STATS_KEY, "evictions", len(evicted))
+                    pipe.execute()
+        except Exception as e:
+            logger.warning(f"LLM cache write failed: {e}")
+
+    async def aget(self, prompt: str, route: Route, json_mode: bool) -> str | None:
+        return await asyncio.to_thread(self.get, prompt, route, json_mode)
+
+    async def aset(self, prompt: str, route: Route, json_mode: bool, response: str) -> None:
+        await asyncio.to_thread(self.set, prompt, route, json_mode, response)
+
+    def stats(self) -> dict:
+        r = get_redis()
+        if not r:
+            return {"redis": "unavailable"}
+        try:
+            counters = r.hgetall(STATS_KEY)
+            hits     = int(counters.get("hits", 0))
+            misses   = int(counters.get("misses", 0))
+            return {
+                "redis":       "connected",
+                "entries":     r.zcard(INDEX_KEY),
+                "max_entries": self.max_entries,
+                "ttl_sec":     self.ttl,
+                "hits":        hits,
+                "misses":      misses,
+                "evictions":   int(counters.get("evictions", 0)),
+                "hit_rate":    round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            }
+        except Exception as e:
+            return {"redis": "error", "detail": str(e)}
+
+
+llm_cache = LLMResponseCache(
+    ttl=settings.llm_cache_ttl_sec,
+    max_entries=settings.llm_cache_max_entries,
+)
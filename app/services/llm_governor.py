@@ -0,0 +1,162 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+from app.config import settings
+
+logger = logging.getLogger("docforge.llm_governor")
+
+CHARS_PER_TOKEN = 4      # rough prompt-size estimate; no tokenizer needed for admission control
+WAIT_SAMPLES    = 500    # recent queue waits kept per class for the percentiles
+SLOW_WAIT_SEC   = 5.0    # waits longer than this are logged
+
+# (tenant, class) of the LLM calls made in this request or task — see set_llm_tenant()
+_tenant: ContextVar[tuple[str, str]] = ContextVar("llm_tenant", default=("default", "interactive"))
+
+
+def set_llm_tenant(tenant: str, kind: str = "interactive") -> None:
+    """
+    Attribute this request's LLM calls to `tenant` (a session id) and a class —
+    "interactive" for a user waiting on the answer, "batch" for bulk and
+    background generation. Tasks started afterwards inherit it.
+    """
+    _tenant.set((tenant, kind))
+
+
+def estimate_tokens(text: str) -> int:
+    """Prompt tokens estimated from length, plus the expected completion."""
+    return len(text) // CHARS_PER_TOKEN + settings.llm_expected_output_tokens
+
+
+class LLMGovernor:
+    """
+    Admission control for Azure OpenAI calls in this process.
+
+    A call starts only while fewer than `max_concurrent` calls are running and
+    the estimated tokens of the calls in flight stay within `token_budget`
+    (a lone call is always admitted, however large), so a bulk run can no
+    longer push the deployment past its TPM quota and into 429s for everyone.
+
+    Calls that cannot start queue in start-time fair order: each gets the tag
+    max(virtual time, its tenant's last finish tag) and advances its tenant
+    by tokens / weight. Tenants that have sent little go ahead of one that
+    sent a lot, and interactive calls (weight llm_weight_interactive) get
+    that many times the share of batch calls. Limits are per process — size
+    llm_token_budget as the deployment's per-minute quota spread over workers.
+    """
+
+    def __init__(self, max_concurrent: int, token_budget: int, weights: dict[str, float]):
+        self.max_concurrent = max_concurrent
+        self.token_budget   = token_budget
+        self.weights        = weights
+        self._active        = 0
+        self._tokens        = 0
+        self._vtime         = 0.0
+        self._finish: dict[str, float] = {}   # tenant → finish tag of its last call
+        self._heap: list = []                  # (start tag, seq, future, tokens)
+        self._seq           = itertools.count()
+        self._waits: dict[str, deque] = {}
+        self._counts: dict[str, dict] = {}
+
+    def _fits(self, tokens: int) -> bool:
+        return self._active < self.max_concurrent and \
+            (self._active == 0 or self._tokens + tokens <= self.token_budget)
+
+    def _admit(self, tokens: int) -> None:
+        self._active += 1
+        self._tokens += tokens
+
+    def _release(self, tokens: int) -> None:
+        self._active -= 1
+        self._tokens -= tokens
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        # Strict head of line — a large call at the front is never overtaken, only waited for
+        while self._heap:
+            start, _, fut, tokens = self._heap[0]
+            if fut.done():                  # waiter cancelled
+                heapq.heappop(self._heap)
+                continue
+            if not self._fits(tokens):
+                break
+            heapq.heappop(self._heap)
+            self._vtime = max(self._vtime, start)
+            self._admit(tokens)
+            fut.set_result(None)
+        if len(self._finish) > 1000:
+            self._finish = {t: f for t, f in self._finish.items() if f > self._vtime}
+
+    def _tag(self, tenant: str, tokens: int, weight: float) -> float:
+        start = max(self._vtime, self._finish.get(tenant, 0.0))
+        self._finish[tenant] = start + tokens / weight
+        return start
+
+    @asynccontextmanager
+    async def slot(self, tokens: int):
+        """Hold one admitted call of an estimated `tokens` for the duration of the block."""
+        tenant, kind = _tenant.get()
+        start  = self._tag(tenant, tokens, self.weights.get(kind, 1.0))
+        queued = time.monotonic()
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (start, next(self._seq), fut, tokens))
+        self._dispatch()   # admits it right away when nothing is ahead and there is room
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self._release(tokens)   # admitted just as the caller went away
+            raise
+
+        waited = time.monotonic() - queued
+        self._record(kind, waited)
+        if waited > SLOW_WAIT_SEC:
+            logger.warning(f"LLM call for {tenant} ({kind}) queued {waited:.1f}s")
+        try:
+            yield waited
+        finally:
+            self._release(tokens)
+
+    def _record(self, kind: str, waited: float) -> None:
+        self._waits.setdefault(kind, deque(maxlen=WAIT_SAMPLES)).append(waited)
+        counts = self._counts.setdefault(kind, {"calls": 0, "queued": 0, "wait_sec_total": 0.0})
+        counts["calls"]          += 1
+        counts["queued"]         += waited > 0.001
+        counts["wait_sec_total"] += waited
+
+    def metrics(self) -> dict:
+        def pct(samples: list, p: float) -> float:
+            return round(samples[min(len(samples) - 1, int(len(samples) * p))], 3) if samples else 0.0
+
+        classes = {}
+        for kind, counts in self._counts.items():
+            samples = sorted(self._waits.get(kind, ()))
+            classes[kind] = {
+                "calls":        counts["calls"],
+                "queued":       counts["queued"],
+                "wait_avg_sec": round(counts["wait_sec_total"] / counts["calls"], 3),
+                "wait_p50_sec": pct(samples, 0.5),
+                "wait_p95_sec": pct(samples, 0.95),
+                "wait_max_sec": round(samples[-1], 3) if samples else 0.0,
+            }
+        return {
+            "max_concurrent":   self.max_concurrent,
+            "token_budget":     self.token_budget,
+            "active":           self._active,
+            "tokens_in_flight": self._tokens,
+            "waiting":          sum(1 for _, _, fut, _ in self._heap if not fut.done()),
+            "classes":          classes,
+        }
+
+
+llm_governor = LLMGovernor(
+    max_concurrent=settings.llm_max_concurrency,
+    token_budget=settings.llm_token_budget,
+    weights={"interactive": settings.llm_weight_interactive, "batch": settings.llm_weight_batch},
+)
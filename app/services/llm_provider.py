@@ -1,18 +1,160 @@
+from typing import AsyncIterator
+
+import httpx
 from langchain_openai import AzureChatOpenAI
 from langchain_core.messages import HumanMessage
+from langchain_core.runnables import Runnable
 from app.config import settings
+from app.services.llm_governor import estimate_tokens, llm_governor
+from app.services.llm_resilience import call_llm
+from app.services.llm_routing import DEFAULT_TEMPERATURE, Route, resolve_route
+from app.services.llm_usage import llm_usage
+from app.services.prompt_builder import Prompt
+
+
+def _messages(prompt: "str | Prompt") -> tuple[list, int]:
+    """Chat messages and token estimate for a prompt — bare strings are sent as one user message."""
+    if isinstance(prompt, Prompt):
+        return prompt.messages(), estimate_tokens(prompt.text)
+    return [HumanMessage(content=prompt)], estimate_tokens(prompt)
 
 
 class LLMProvider:
+    """
+    Azure chat calls for the services. Each prompt's task picks its route —
+    deployment, temperature, max_tokens and deadline (services/llm_routing.py).
+    Every call goes through the governor (a slot per attempt) and the
+    resilience layer: a deadline, jittered retries, a circuit breaker per
+    deployment and failover — or, for generate(), optional hedging — to the
+    route's secondary deployment.
+    """
+
+    def __init__(self, http_async_client: httpx.AsyncClient | None = None):
+        self.deployment  = settings.AZURE_LLM_DEPLOYMENT_41_MINI   # defaults — see route()
+        self.temperature = DEFAULT_TEMPERATURE
+        self._http       = http_async_client
+        self._clients: dict[tuple, Runnable] = {}
+
+    @staticmethod
+    def route(prompt: str | Prompt) -> Route:
+        if isinstance(prompt, Prompt):
+            return resolve_route(prompt.task, prompt.routing)
+        return resolve_route("other")
+
+    def client(self, route: Route, deployment: str, json_mode: bool = False) -> Runnable:
+        """
+        Chat model for a deployment with the route's sampling settings, created
+        once per combination; JSON mode binds response_format=json_object.
+        """
+        timeout = min(settings.llm_attempt_timeout_sec, route.timeout_sec)
+        key = (deployment, route.temperature, route.max_tokens, timeout, json_mode and settings.llm_json_mode)
+        if key not in self._clients:
+            llm = AzureChatOpenAI(
+                azure_endpoint=settings.AZURE_LLM_ENDPOINT,
+                azure_deployment=deployment,
+                api_key=settings.AZURE_OPENAI_LLM_KEY,
+                api_version=settings.AZURE_LLM_API_VERSION,
+                temperature=route.temperature,
+                max_tokens=route.max_tokens,
+                http_async_client=self._http,
+                stream_usage=True,     # final stream chunk carries token usage, incl. cached prompt tokens
+                max_retries=0,         # retries are ours (llm_resilience) — the SDK's would hide 429s and stack up
+                timeout=timeout,
+            )
+            # JSON mode — the model can only emit a syntactically valid JSON object (it may still be cut off)
+            self._clients[key] = llm.bind(response_format={"type": "json_object"}) if key[-1] else llm
+        return self._clients[key]
+
+    async def generate(self, prompt: str | Prompt, json_mode: bool = False) -> str:
+        """`json_mode` is for prompts that ask for a JSON object and name JSON in their text, as Azure requires."""
+        messages, tokens = _messages(prompt)
+        route = self.route(prompt)
+
+        async def attempt(deployment: str):
+            async with llm_governor.slot(tokens):
+                return await self.client(route, deployment, json_mode).ainvoke(messages)
+
+        response = await call_llm(attempt, route.deployment, route.secondary, hedge=True,
+                                  deadline_sec=route.timeout_sec)
+        await llm_usage.arecord(route.task, response.usage_metadata)
+        return response.content.strip()
+
+    async def stream(self, prompt: str | Prompt) -> AsyncIterator[str]:
+        """
+        Yield content tokens as the model produces them. Retries and failover
+        cover the wait for the first token; once tokens have been sent an
+        error ends the stream.
+        """
+        messages, tokens = _messages(prompt)
+        route = self.route(prompt)
+
+        async def attempt(deployment: str):
+            chunks = self.client(route, deployment).astream(messages)
+            try:
+                return chunks, await anext(chunks, None)
+            except BaseException:
+                await chunks.aclose()
+                raise
+
+        usage = None
+        # The slot is held until the last token — a stream occupies the deployment the whole time
+        async with llm_governor.slot(tokens):
+            chunks, chunk = await call_llm(attempt, route.deployment, route.secondary,
+                                           deadline_sec=route.timeout_sec)
+            try:
+                while chunk is not None:
+                    if chunk.usage_metadata:
+                        usage = chunk.usage_metadata
+                    if chunk.content:
+                        yield chunk.content
+                    chunk = await anext(chunks, None)
+            finally:
+                await chunks.aclose()
+        await llm_usage.arecord(route.task, usage)
+
+
+class LLMRegistry:
+    """
+    Process-wide LLM clients.
+
+    One pooled httpx.AsyncClient is shared by every LLMProvider, so requests
+    reuse warm keep-alive connections to Azure instead of paying for a new
+    client and TLS handshake per call. Created in the FastAPI lifespan and
+    closed on shutdown; scripts that never run the lifespan get a lazily
+    created one on first use.
+    """
+
     def __init__(self):
-        self.llm = AzureChatOpenAI(
-            azure_endpoint=settings.AZURE_LLM_ENDPOINT,
-            azure_deployment=settings.AZURE_LLM_DEPLOYMENT_41_MINI,
-            api_key=settings.AZURE_OPENAI_LLM_KEY,
-            api_version=settings.AZURE_LLM_API_VERSION,
-            temperature=0.2,
+        self.http_client: httpx.AsyncClient | None = None
+        self.provider: LLMProvider | None = None
+
+    def startup(self) -> None:
+        if self.provider is not None:
+            return
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.llm_max_connections,
+                max_keepalive_connections=settings.llm_max_keepalive_connections,
+                keepalive_expiry=settings.llm_keepalive_expiry_sec,
+            ),
         )
+        self.provider = LLMProvider(http_async_client=self.http_client)
 
-    async def generate(self, prompt: str) -> str:
-        response = await self.llm.ainvoke([HumanMessage(content=prompt)])
-        return response.content.strip()
+    async def shutdown(self) -> None:
+        if self.http_client is not None:
+            await self.http_client.aclose()
+        self.http_client = None
+        self.provider = None
+
+    def get_provider(self) -> LLMProvider:
+        if self.provider is None:
+            self.startup()
+        return self.provider
+
+
+llm_registry = LLMRegistry()
+
+
+def get_llm_provider() -> LLMProvider:
+    """FastAPI dependency — the shared, connection-pooled provider."""
+    return llm_registry.get_provider()
@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, TypeVar
+
+import openai
+from fastapi import HTTPException
+
+from app.config import settings
+
+logger = logging.getLogger("docforge.llm_resilience")
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class CircuitOpen(Exception):
+    """The deployment's circuit is open — the call was not attempted."""
+
+
+# ─── Error classification ─────────────────────────────────────
+def _status(exc: Exception) -> int | None:
+    return getattr(exc, "status_code", None)
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, (openai.APIConnectionError, TimeoutError)):   # APITimeoutError included
+        return True
+    return _status(exc) in RETRYABLE_STATUS
+
+
+def is_outage(exc: Exception) -> bool:
+    """Errors that say the deployment is unhealthy — 429 is quota pressure, not an outage."""
+    return is_retryable(exc) and _status(exc) != 429
+
+
+def retry_after(exc: Exception) -> float | None:
+    """Azure's retry-after-ms / retry-after (seconds) header, if the error carries one."""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return max(float(headers.get(name, "")) * scale, 0.0)
+        except ValueError:
+            continue
+    return None
+
+
+def backoff(attempt: int) -> float:
+    """Full jitter — spreads retries from many callers instead of syncing them up."""
+    return random.uniform(0, min(settings.llm_backoff_max_sec, settings.llm_backoff_base_sec * (2 ** attempt)))
+
+
+# ─── Circuit breaker ──────────────────────────────────────────
+class CircuitBreaker:
+    """
+    Per-deployment breaker. `failures` consecutive outage errors open it;
+    while open every call fails fast for `reset_sec`, then one probe call is
+    let through — its success closes the circuit, its failure re-opens it.
+    """
+
+    def __init__(self, failures: int, reset_sec: float):
+        self.threshold  = failures
+        self.reset_sec  = reset_sec
+        self.state      = "closed"
+        self.failures   = 0
+        self.opened_at  = 0.0
+        self._probing   = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_sec:
+                return False
+            self.state = "half_open"
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def success(self) -> None:
+        self.state, self.failures, self._probing = "closed", 0, False
+
+    def failure(self) -> None:
+        self.failures += 1
+        self._probing  = False
+        if self.state == "half_open" or self.failures >= self.threshold:
+            if self.state != "open":
+                logger.warning(f"LLM circuit opened after {self.failures} failures")
+            self.state, self.opened_at = "open", time.monotonic()
+
+    def neutral(self) -> None:
+        """The call ended without telling us anything about the deployment's health."""
+        self._probing = False
+
+    def view(self) -> dict:
+        return {
+            "state":     self.state,
+            "failures":  self.failures,
+            "opened_at": round(time.time() - (time.monotonic() - self.opened_at)) if self.state != "closed" else None,
+        }
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def breaker(deployment: str) -> CircuitBreaker:
+    if deployment not in _breakers:
+        _breakers[deployment] = CircuitBreaker(settings.llm_breaker_failures, settings.llm_breaker_reset_sec)
+    return _breakers[deployment]
+
+
+def breaker_states() -> dict:
+    return {name: b.view() for name, b in _breakers.items()}
+
+
+# ─── Calls ────────────────────────────────────────────────────
+async def _with_retries(deployment: str, attempt: Callable[[str], Awaitable[T]], deadline: float) -> T:
+    """`attempt(deployment)` with jittered retries honouring retry-after, inside the breaker and the deadline."""
+    loop = asyncio.get_running_loop()
+    brk  = breaker(deployment)
+    for n in range(settings.llm_max_retries + 1):
+        if not brk.allow():
+            raise CircuitOpen(deployment)
+        try:
+            result = await attempt(deployment)
+        except asyncio.CancelledError:
+            brk.neutral()
+            raise
+        except Exception as e:
+            if is_outage(e):
+                brk.failure()
+            elif _status(e) == 429:
+                brk.neutral()   # quota pressure — neither counts against the deployment nor clears its failures
+            elif isinstance(e, openai.APIStatusError):
+                brk.success()   # the deployment answered — the request itself was bad
+            else:
+                brk.neutral()
+            if not is_retryable(e) or n == settings.llm_max_retries:
+                raise
+            delay = retry_after(e)
+            delay = backoff(n) if delay is None else delay
+            if loop.time() + delay >= deadline:
+                raise
+            logger.warning(f"LLM call to {deployment} failed ({_status(e) or type(e).__name__}), retry {n + 1} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+        else:
+            brk.success()
+            return result
+
+
+def _fails_over(exc: BaseException) -> bool:
+    return isinstance(exc, CircuitOpen) or (isinstance(exc, Exception) and is_retryable(exc))
+
+
+async def _hedged(attempt, primary: str, secondary: str, deadline: float):
+    """Start the secondary too once the primary is slower than llm_hedge_after_sec; first success wins."""
+    first = asyncio.create_task(_with_retries(primary, attempt, deadline))
+    done, _ = await asyncio.wait({first}, timeout=settings.llm_hedge_after_sec)
+    if done and (not first.exception() or not _fails_over(first.exception())):
+        return first.result()
+
+    tasks = {first, asyncio.create_task(_with_retries(secondary, attempt, deadline))} - done
+    if done:
+        logger.warning(f"LLM primary {primary} failed — failing over to {secondary}")
+    errors = [first.exception()] if done else []
+    try:
+        while tasks:
+            finished, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                if task.exception() is None:
+                    return task.result()
+                errors.append(task.exception())
+        raise errors[0]
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def call_llm(attempt: Callable[[str], Awaitable[T]], primary: str, secondary: str | None = None,
+                   hedge: bool = False, deadline_sec: float | None = None) -> T:
+    """
+    Run `attempt(deployment)` against Azure within `deadline_sec` (llm_deadline_sec by default).
+
+    Retryable failures (429, 5xx, timeouts, connection errors) are retried
+    per deployment; when the primary is exhausted or its circuit is open the
+    secondary deployment is tried. With `hedge` and llm_hedge_after_sec set,
+    a slow primary is raced against the secondary instead. Raises
+    HTTPException 503 when every circuit is open and 504 on the deadline.
+    """
+    deadline_sec = deadline_sec or settings.llm_deadline_sec
+    loop         = asyncio.get_running_loop()
+    deadline     = loop.time() + deadline_sec
+    try:
+        async with asyncio.timeout_at(deadline):
+            if not secondary or secondary == primary:
+                return await _with_retries(primary, attempt, deadline)
+            if hedge and settings.llm_hedge_after_sec > 0:
+                return await _hedged(attempt, primary, secondary, deadline)
+            try:
+                return await _with_retries(primary, attempt, deadline)
+            except Exception as e:
+                if not _fails_over(e):
+                    raise
+                logger.warning(f"LLM primary {primary} unavailable ({e!r}) — failing over to {secondary}")
+                return await _with_retries(secondary, attempt, deadline)
+    except TimeoutError:
+        raise HTTPException(status_code=504, detail=f"LLM call exceeded its {deadline_sec:g}s deadline")
+    except CircuitOpen as e:
+        raise HTTPException(
+            status_code=503, detail=f"LLM deployment {e} is failing — try again shortly",
+            headers={"Retry-After": str(int(settings.llm_breaker_reset_sec))},
+        )
@@ -0,0 +1,91 @@
+"""
+Task → Azure deployment routing.
+
+Every prompt carries a task ("questions", "questions_batch", "section",
+"enhance"; bare strings are "other"). settings.llm_routes maps tasks to a
+route; fields left out fall back to the provider defaults:
+
+    {"questions": {"deployment": "gpt-41-nano", "max_tokens": 600, "timeout_sec": 20}}
+
+A template can override routes for its own sessions under
+generation_rules["model_routing"], in the same shape. The block is routing
+only — it is taken out of generation_rules before the rules reach a prompt.
+"""
+import logging
+from dataclasses import dataclass, replace
+
+from app.config import settings
+
+logger = logging.getLogger("docforge.llm_routing")
+
+ROUTING_RULE        = "model_routing"   # generation_rules key holding per-template overrides
+DEFAULT_TEMPERATURE = 0.2
+ROUTED_TASKS        = ("questions", "questions_batch", "section", "enhance", "other")
+
+# route field → type it is coerced to
+ROUTE_FIELDS = {
+    "deployment":  str,
+    "secondary":   str,
+    "temperature": float,
+    "max_tokens":  int,
+    "timeout_sec": float,
+}
+# Fields an override may clear — no secondary, or the deployment's own token limit.
+# Empty values for the rest are ignored so a bad entry keeps the default.
+NULLABLE_FIELDS = ("secondary", "max_tokens")
+
+
+@dataclass(frozen=True)
+class Route:
+    task:        str
+    deployment:  str
+    secondary:   str | None
+    temperature: float
+    max_tokens:  int | None     # None — the deployment's own limit
+    timeout_sec: float          # deadline for the whole call, retries included
+
+
+def _apply(route: Route, spec, source: str) -> Route:
+    if not isinstance(spec, dict):
+        return route
+    fields = {}
+    for name, value in spec.items():
+        cast = ROUTE_FIELDS.get(name)
+        if cast is None:
+            logger.warning(f"Unknown LLM route field {name!r} in {source} — ignored")
+            continue
+        if value in (None, ""):
+            if name in NULLABLE_FIELDS:
+                fields[name] = None
+            else:
+                logger.warning(f"Empty LLM route value {name!r} in {source} — keeping {getattr(route, name)!r}")
+            continue
+        try:
+            fields[name] = cast(value)
+        except (TypeError, ValueError):
+            logger.warning(f"Bad LLM route value {name}={value!r} in {source} — ignored")
+    return replace(route, **fields)
+
+
+def resolve_route(task: str, overrides: dict | None = None) -> Route:
+    """Route for `task` — defaults, then settings.llm_routes, then the template's overrides."""
+    route = Route(
+        task=task,
+        deployment=settings.AZURE_LLM_DEPLOYMENT_41_MINI,
+        secondary=settings.AZURE_LLM_DEPLOYMENT_SECONDARY or None,
+        temperature=DEFAULT_TEMPERATURE,
+        max_tokens=None,
+        timeout_sec=settings.llm_deadline_sec,
+    )
+    route = _apply(route, settings.llm_routes.get(task), "LLM_ROUTES")
+    if isinstance(overrides, dict):
+        route = _apply(route, overrides.get(task), f"generation_rules.{ROUTING_RULE}")
+    return route
+
+
+def split_routing(generation_rules: dict) -> tuple[dict, dict | None]:
+    """generation_rules without the routing block, and the block itself."""
+    if ROUTING_RULE not in generation_rules:
+        return generation_rules, None
+    rules = dict(generation_rules)
+    return rules, rules.pop(ROUTING_RULE)
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import threading
+
+from app.redis_client import STATE_PREFIX, get_redis
+
+logger = logging.getLogger("docforge.llm_usage")
+
+# Running totals, not cache — kept outside docforge:* so /cache/bust leaves them alone
+USAGE_KEY = f"{STATE_PREFIX}llm:usage"   # hash: {task}:{calls|input|cached|output} -> running total
+PARSE_KEY = f"{STATE_PREFIX}llm:parse"   # hash: {task}:{ok|repaired|failed} -> responses
+FIELDS    = ("calls", "input", "cached", "output")
+OUTCOMES  = ("ok", "repaired", "failed")
+
+
+class LLMUsage:
+    """
+    Token counters per prompt task, from the usage metadata of every LLM call.
+
+    `cached` is the part of the input Azure served from its prompt cache
+    (usage.prompt_tokens_details.cached_tokens) — the share of it in `input`
+    shows how well prompt prefixes are being reused. Totals live in Redis so
+    every worker adds to the same numbers; without Redis they are kept per
+    process.
+
+    Parse outcomes of JSON responses are counted the same way: `repaired`
+    responses were salvaged instead of re-asked, `failed` ones cost a retry.
+    Async callers use arecord()/arecord_parse(), which do the Redis write in
+    a thread instead of on the event loop.
+    """
+
+    def __init__(self):
+        self._local: dict[str, int] = {}
+        self._local_parse: dict[str, int] = {}
+        self._lock = threading.Lock()   # local counters are bumped from arecord()'s worker threads
+
+    def _incr(self, local: dict, key: str, counts: dict) -> None:
+        r = get_redis()
+        if r is not None:
+            try:
+                pipe = r.pipeline(transaction=False)
+                for field, n in counts.items():
+                    pipe.hincrby(key, field, n)
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.warning(f"LLM usage write failed — counting locally: {e}")
+        with self._lock:
+            for field, n in counts.items():
+                local[field] = local.get(field, 0) + n
+
+    def _read(self, local: dict, key: str) -> tuple[dict, str]:
+        r = get_redis()
+        if r is not None:
+            try:
+                return r.hgetall(key), "redis"
+            except Exception as e:
+                logger.warning(f"LLM usage read failed: {e}")
+        with self._lock:
+            return dict(local), "local"
+
+    def record(self, task: str, usage: dict | None) -> None:
+        if not usage:
+            return
+        details = usage.get("input_token_details") or {}
+        counts  = {
+            "calls":  1,
+            "input":  usage.get("input_tokens", 0),
+            "cached": details.get("cache_read", 0) or 0,
+            "output": usage.get("output_tokens", 0),
+        }
+        self._incr(self._local, USAGE_KEY, {f"{task}:{field}": n for field, n in counts.items()})
+
+    def record_parse(self, task: str, outcome: str) -> None:
+        self._incr(self._local_parse, PARSE_KEY, {f"{task}:{outcome}": 1})
+
+    async def arecord(self, task: str, usage: dict | None) -> None:
+        if usage:
+            await asyncio.to_thread(self.record, task, usage)
+
+    async def arecord_parse(self, task: str, outcome: str) -> None:
+        await asyncio.to_thread(self.record_parse, task, outcome)
+
+    def stats(self) -> dict:
+        raw, source = self._read(self._local, USAGE_KEY)
+        tasks: dict[str, dict] = {}
+        for key, value in raw.items():
+            task, _, field = key.rpartition(":")
+            if field in FIELDS:
+                tasks.setdefault(task, dict.fromkeys(FIELDS, 0))[field] = int(value)
+        for counts in tasks.values():
+            counts["cache_hit_ratio"] = round(counts["cached"] / counts["input"], 3) if counts["input"] else 0.0
+        return {"source": source, "tasks": tasks}
+
+    def parse_stats(self) -> dict:
+        raw, source = self._read(self._local_parse, PARSE_KEY)
+        tasks: dict[str, dict] = {}
+        for key, value in raw.items():
+            task, _, outcome = key.rpartition(":")
+            if outcome in OUTCOMES:
+                tasks.setdefault(task, dict.fromkeys(OUTCOMES, 0))[outcome] = int(value)
+        for counts in tasks.values():
+            total = sum(counts[o] for o in OUTCOMES)
+            counts["failure_rate"] = round(counts["failed"] / total, 3) if total else 0.0
+        return {"source": source, "tasks": tasks}
+
+
+llm_usage = LLMUsage()
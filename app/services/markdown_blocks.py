@@ -0,0 +1,102 @@
+"""
+Markdown → block AST shared by the PDF and Notion exporters.
+
+Compiled documents are tokenized once (at compile time, cached on the
+generated_documents record) and each exporter walks the same blocks, so the
+PDF and the Notion page always agree on what is a heading, a list item or a
+table. Blocks are plain dicts so they store in Mongo and pickle to the PDF
+worker processes as-is:
+
+    {"type": "heading",   "level": 1-3, "spans": [...]}
+    {"type": "paragraph", "spans": [...]}
+    {"type": "bullet",    "spans": [...]}
+    {"type": "numbered",  "marker": "1.", "spans": [...]}
+    {"type": "table",     "rows": [[spans, ...], ...]}    # separator rows dropped
+    {"type": "divider"}
+    {"type": "blank"}                                      # empty line — spacing only
+
+A span is {"text": str, "bold": bool}.
+"""
+import re
+from typing import Iterator
+
+AST_VERSION = 1   # bump when block shapes change — cached ASTs with another version are rebuilt
+
+_BOLD_RE      = re.compile(r"(\*\*.*?\*\*)")
+_NUMBERED_RE  = re.compile(r"^(\d+[.)])\s+(.*)")
+_TABLE_SEP_RE = re.compile(r"^[\s\-:|]+$")
+_HEADINGS     = (("### ", 3), ("## ", 2), ("# ", 1))
+_DIVIDERS     = ("---", "***", "___")
+
+
+def spans(text: str) -> list:
+    """Split **bold** segments out of a line of text."""
+    out = []
+    for part in _BOLD_RE.split(text):
+        if len(part) > 4 and part.startswith("**") and part.endswith("**"):
+            out.append({"text": part[2:-2], "bold": True})
+        elif part:
+            out.append({"text": part, "bold": False})
+    return out
+
+
+def plain(spans_: list) -> str:
+    return "".join(s["text"] for s in spans_)
+
+
+def _table(lines: list) -> dict | None:
+    rows = [
+        [spans(c.strip()) for c in line.strip().strip("|").split("|")]
+        for line in lines
+        if not _TABLE_SEP_RE.match(line.strip().strip("|"))
+    ]
+    return {"type": "table", "rows": rows} if rows else None
+
+
+def iter_blocks(content: str) -> Iterator[dict]:
+    """Yield the blocks of a markdown document in order, in one pass over its lines."""
+    lines = content.split("\n")
+    i = 0
+    while i < len(lines):
+        stripped = lines[i].strip()
+        i += 1
+
+        if not stripped:
+            yield {"type": "blank"}
+            continue
+        if stripped in _DIVIDERS:
+            yield {"type": "divider"}
+            continue
+
+        if stripped.startswith("|"):
+            table_lines = [stripped]
+            while i < len(lines) and lines[i].strip().startswith("|"):
+                table_lines.append(lines[i].strip())
+                i += 1
+            table = _table(table_lines)
+            if table:
+                yield table
+            continue
+
+        heading = next(((prefix, level) for prefix, level in _HEADINGS if stripped.startswith(prefix)), None)
+        if heading:
+            yield {"type": "heading", "level": heading[1], "spans": spans(stripped[len(heading[0]):].strip())}
+            continue
+
+        if stripped.startswith(("- ", "* ")):
+            yield {"type": "bullet", "spans": spans(stripped[2:].strip())}
+            continue
+
+        numbered = _NUMBERED_RE.match(stripped)
+        if numbered:
+            yield {"type": "numbered", "marker": numbered.group(1), "spans": spans(numbered.group(2).strip())}
+            continue
+
+        yield {"type": "paragraph", "spans": spans(stripped)}
+
+
+def document_blocks(doc: dict) -> list:
+    """Blocks for a generated_documents record — the cached AST when it is current, else parsed now."""
+    if doc.get("ast_version") == AST_VERSION and doc.get("blocks") is not None:
+        return doc["blocks"]
+    return list(iter_blocks(doc.get("compiled_content", "")))
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+
+import httpx
+from fastapi import HTTPException
+
+from app.config import settings
+from app.services.rate_limiter import notion_rate_limiter
+
+logger = logging.getLogger("docforge.notion")
+
+# ─── Notion API config ────────────────────────────────────────
+NOTION_API_KEY     = settings.notion_api_key
+NOTION_DATABASE_ID = settings.notion_database_id
+NOTION_VERSION     = "2022-06-28"
+NOTION_BASE_URL    = "https://api.notion.com/v1"
+
+MAX_RETRIES        : int   = 5     # max back-off retries on 429 / transport errors
+BACKOFF_BASE_SEC   : float = 1.5   # exponential back-off base
+REQUEST_TIMEOUT_SEC: float = 30.0
+
+
+class NotionAPIError(HTTPException):
+    """A Notion error response — a 502 to callers, with Notion's own status kept in `notion_status`."""
+
+    def __init__(self, notion_status: int, detail: str):
+        super().__init__(status_code=502, detail=f"Notion API error: {detail}")
+        self.notion_status = notion_status
+
+
+class NotionClient:
+    """
+    Async Notion API client on one persistent httpx.AsyncClient.
+
+    Keep-alive connections are reused across calls, so a multi-batch publish
+    pays for one TLS handshake instead of one per request. Every call takes a
+    token from the shared Notion rate limiter first. 429s, timeouts and
+    connection errors are retried with asyncio.sleep back-off and never block a thread.
+    """
+
+    def __init__(self):
+        self._client: httpx.AsyncClient | None = None
+
+    def start(self) -> None:
+        if self._client is not None:
+            return
+        self._client = httpx.AsyncClient(
+            base_url=NOTION_BASE_URL,
+            headers={
+                "Authorization":  f"Bearer {NOTION_API_KEY}",
+                "Notion-Version": NOTION_VERSION,
+                "Content-Type":   "application/json",
+            },
+            timeout=REQUEST_TIMEOUT_SEC,
+            limits=httpx.Limits(
+                max_connections=settings.notion_max_connections,
+                max_keepalive_connections=settings.notion_max_connections,
+                keepalive_expiry=settings.notion_keepalive_expiry_sec,
+            ),
+        )
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = None
+
+    @staticmethod
+    def _retry_after(resp: httpx.Response, attempt: int) -> float:
+        """Seconds to back off after a 429 — Notion's Retry-After if sent, else exponential."""
+        try:
+            return max(float(resp.headers.get("Retry-After", "")), 0.0)
+        except ValueError:
+            return BACKOFF_BASE_SEC * (2 ** attempt)
+
+    async def request(self, method: str, path: str, payload: dict | None = None) -> dict:
+        """
+        Call the Notion API. `path` is relative to NOTION_BASE_URL (e.g. "/pages").
+        Raises HTTPException 502/504 so routes and jobs can surface the failure as-is;
+        Notion error responses raise NotionAPIError, which keeps Notion's status code.
+        """
+        self.start()
+        for attempt in range(MAX_RETRIES):
+            await notion_rate_limiter.acquire_async()
+            try:
+                resp = await self._client.request(method, path, json=payload)
+            except httpx.TransportError as e:
+                # Timeouts, refused/reset connections, a keep-alive socket closed under us
+                if attempt == MAX_RETRIES - 1:
+                    if isinstance(e, httpx.TimeoutException):
+                        raise HTTPException(status_code=504, detail="Notion API timed out")
+                    raise HTTPException(status_code=502, detail=f"Notion API unreachable: {e!r}")
+                logger.warning(f"Notion {method} {path} failed ({type(e).__name__}), retry {attempt + 1}")
+                await asyncio.sleep(BACKOFF_BASE_SEC * (2 ** attempt))
+                continue
+
+            if resp.status_code == 429:
+                # Pause every worker, not just this call
+                await notion_rate_limiter.block_for_async(self._retry_after(resp, attempt))
+                continue
+            if resp.is_error:
+                try:    detail = resp.json().get("message", resp.text)
+                except ValueError: detail = resp.text
+                raise NotionAPIError(resp.status_code, detail)
+            return resp.json()
+        raise HTTPException(status_code=502, detail="Notion API failed after max retries")
+
+
+notion_client = NotionClient()
+
+
+def get_notion_client() -> NotionClient:
+    return notion_client
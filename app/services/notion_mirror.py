@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+
+from app.config import settings
+from app.db import get_async_db
+from app.redis_client import STATE_PREFIX, get_redis
+from app.services.notion_client import NOTION_DATABASE_ID, notion_client
+
+logger = logging.getLogger("docforge.notion_mirror")
+
+QUERY_PAGE_SIZE = 100                        # Notion's maximum for databases/query
+STATE_ID        = "library"                  # _id of the sync watermark in notion_sync_state
+LOCK_KEY        = f"{STATE_PREFIX}notion:mirror:lock"   # outside docforge:* so /cache/bust never frees it
+LOCK_TTL_SEC    = 600
+
+
+def _plain_text(props: dict, name: str) -> str:
+    prop  = props.get(name, {})
+    ptype = prop.get("type")
+    if ptype not in ("title", "rich_text"):
+        return ""
+    return "".join(t.get("plain_text", "") for t in prop.get(ptype, []))
+
+
+def page_to_doc(page: dict) -> dict:
+    """Flatten a Notion page into the notion_library mirror document."""
+    props = page.get("properties", {})
+    tags  = _plain_text(props, "tags")
+    return {
+        "_id":              page["id"],
+        "page_id":          page["id"],
+        "title":            _plain_text(props, "Name"),
+        "industry":         _plain_text(props, "industry"),
+        "version":          _plain_text(props, "version"),
+        "tags":             tags,
+        "tag_list":         [t.strip() for t in tags.split(",") if t.strip()],
+        "url":              page.get("url", ""),
+        "created_time":     page.get("created_time", ""),
+        "last_edited_time": page.get("last_edited_time", ""),
+    }
+
+
+class NotionMirror:
+    """
+    Mongo copy of the Notion library database (`notion_library` collection).
+
+    The library endpoint reads only from the mirror, so page loads never wait
+    on Notion or spend its rate limit. A background loop refreshes it every
+    `notion_mirror_refresh_sec`, asking Notion only for pages edited since the
+    last watermark and following `next_cursor` to the end. Archived pages are
+    not returned by incremental queries, so a full pass runs every
+    `notion_mirror_full_sync_sec` and drops pages Notion no longer lists.
+    A Redis lock keeps multiple workers from refreshing at the same time.
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    # ── Lifecycle ────────────────────────────────────────────
+    def start(self) -> None:
+        if self._task is not None or not NOTION_DATABASE_ID or settings.notion_mirror_refresh_sec <= 0:
+            return
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Notion mirror refresh failed — serving last copy: {e}")
+            await asyncio.sleep(settings.notion_mirror_refresh_sec)
+
+    # ── Refresh ──────────────────────────────────────────────
+    def _lock(self) -> str | None:
+        """Token if this worker may refresh, None when another worker holds the lock."""
+        token = uuid.uuid4().hex
+        r = get_redis()
+        if r is None:
+            return token
+        try:
+            return token if r.set(LOCK_KEY, token, nx=True, ex=LOCK_TTL_SEC) else None
+        except Exception:
+            return token
+
+    def _unlock(self, token: str) -> None:
+        r = get_redis()
+        if r is None:
+            return
+        try:
+            if r.get(LOCK_KEY) == token:
+                r.delete(LOCK_KEY)
+        except Exception:
+            pass
+
+    async def refresh(self, full: bool = False, progress=None) -> dict:
+        """
+        Pull new and edited pages from Notion into the mirror.
+
+        Incremental unless `full` is set, no watermark exists yet, or the last
+        full pass is older than notion_mirror_full_sync_sec. Returns counts.
+        """
+        # The lock calls use the sync Redis client — keep them off the event loop
+        token = await asyncio.to_thread(self._lock)
+        if token is None:
+            return {"skipped": True, "reason": "refresh already running on another worker"}
+        try:
+            return await self._refresh(full, progress)
+        finally:
+            await asyncio.to_thread(self._unlock, token)
+
+    async def _refresh(self, full: bool, progress) -> dict:
+        db      = get_async_db()
+        state   = await db.notion_sync_state.find_one({"_id": STATE_ID}) or {}
+        started = datetime.utcnow()
+
+        last_full = state.get("last_full_sync_at")
+        if not state.get("watermark") or not last_full or \
+                started - last_full > timedelta(seconds=settings.notion_mirror_full_sync_sec):
+            full = True
+
+        payload = {
+            "sorts":     [{"timestamp": "last_edited_time", "direction": "ascending"}],
+            "page_size": QUERY_PAGE_SIZE,
+        }
+        if not full:
+            # last_edited_time has minute precision — on_or_after re-reads the boundary minute, upserts absorb it
+            payload["filter"] = {
+                "timestamp":        "last_edited_time",
+                "last_edited_time": {"on_or_after": state["watermark"]},
+            }
+
+        watermark = state.get("watermark", "")
+        synced    = 0
+        cursor    = None
+        while True:
+            if cursor:
+                payload["start_cursor"] = cursor
+            result = await notion_client.request("POST", f"/databases/{NOTION_DATABASE_ID}/query", payload)
+
+            for page in result.get("results", []):
+                doc = page_to_doc(page)
+                await db.notion_library.replace_one(
+                    {"_id": doc["_id"]}, {**doc, "synced_at": started}, upsert=True,
+                )
+                watermark = max(watermark, doc["last_edited_time"])
+                synced   += 1
+            if progress is not None:
+                await progress.aupdate(pages_synced=synced)
+
+            if not result.get("has_more"):
+                break
+            cursor = result.get("next_cursor")
+
+        removed = 0
+        if full:
+            # Every live page was just stamped with this run's synced_at
+            removed = (await db.notion_library.delete_many({"synced_at": {"$lt": started}})).deleted_count
+
+        update = {"watermark": watermark, "last_sync_at": started}
+        if full:
+            update["last_full_sync_at"] = started
+        await db.notion_sync_state.update_one({"_id": STATE_ID}, {"$set": update}, upsert=True)
+
+        logger.info(f"Notion mirror {'full' if full else 'incremental'} refresh — {synced} synced, {removed} removed")
+        return {"mode": "full" if full else "incremental", "synced": synced, "removed": removed}
+
+    async def upsert_page(self, page: dict) -> None:
+        """Add a freshly published page so it shows up before the next refresh."""
+        doc = page_to_doc(page)
+        await get_async_db().notion_library.replace_one(
+            {"_id": doc["_id"]}, {**doc, "synced_at": datetime.utcnow()}, upsert=True,
+        )
+
+    async def last_sync(self) -> datetime | None:
+        state = await get_async_db().notion_sync_state.find_one({"_id": STATE_ID}, {"last_sync_at": 1})
+        return state.get("last_sync_at") if state else None
+
+
+notion_mirror = NotionMirror()
@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from app.db import get_db
+from app.db import get_async_db
 from app.services.question_service import QuestionService
 from app.services.section_service import SectionService
 
@@ -18,7 +18,7 @@ class OrchestratorService:
     """
 
     def __init__(self):
-        self.db = get_db()
+        self.db = get_async_db()
         self.question_service = QuestionService()
         self.section_service = SectionService()
 
@@ -31,14 +31,14 @@ class OrchestratorService:
         section_json: dict,
         company_context: dict | None = None,
     ) -> dict:
-        session = self.db.doc_sessions.find_one({"_id": session_id})
+        session = await self.db.doc_sessions.find_one({"_id": session_id})
         if not session:
             return {"status": "error", "detail": "Session not found"}
 
         section_id = section_json["id"]
 
         # Idempotent: if questions already exist just return them
-        existing = self.db.session_questions.find_one(
+        existing = await self.db.session_questions.find_one(
             {"session_id": session_id, "section_id": section_id}
         )
         if existing:
@@ -81,7 +81,7 @@ class OrchestratorService:
             "updated_at": datetime.utcnow(),
         }
 
-        self.db.session_questions.insert_one(doc)
+        await self.db.session_questions.insert_one(doc)
 
         return {
             "status": "questions_ready",
@@ -92,13 +92,13 @@ class OrchestratorService:
 
     # STEP 2 – Save user answers (upsert into the questions doc)
 
-    def save_answers(
+    async def save_answers(
         self, session_id: str, section_id: str, answers: list[dict]
     ) -> dict:
         """
         answers: [{"question_id": "q1", "answer": "..."}, ...]
         """
-        existing = self.db.session_questions.find_one(
+        existing = await self.db.session_questions.find_one(
             {"session_id": session_id, "section_id": section_id}
         )
         if not existing:
@@ -112,7 +112,7 @@ class OrchestratorService:
                 q_copy["answer"] = answer_map[q_copy["question_id"]]
             updated_questions.append(q_copy)
 
-        self.db.session_questions.update_one(
+        await self.db.session_questions.update_one(
             {"_id": existing["_id"]},
             {
                 "$set": {
@@ -137,7 +137,7 @@ class OrchestratorService:
     ) -> dict:
         section_id = section_json["id"]
 
-        qa_doc = self.db.session_questions.find_one(
+        qa_doc = await self.db.session_questions.find_one(
             {"session_id": session_id, "section_id": section_id}
         )
         if not qa_doc:
@@ -174,11 +174,11 @@ class OrchestratorService:
         )
 
         # Upsert into doc_sections
-        existing_sec = self.db.doc_sections.find_one(
+        existing_sec = await self.db.doc_sections.find_one(
             {"session_id": session_id, "section_id": section_id}
         )
         if existing_sec:
-            self.db.doc_sections.update_one(
+            await self.db.doc_sections.update_one(
                 {"_id": existing_sec["_id"]},
                 {
                     "$set": {
@@ -192,7 +192,7 @@ class OrchestratorService:
             section_doc_id = existing_sec["_id"]
         else:
             section_doc_id = f"sec_{uuid.uuid4().hex[:8]}"
-            self.db.doc_sections.insert_one(
+            await self.db.doc_sections.insert_one(
                 {
                     "_id": section_doc_id,
                     "session_id": session_id,
@@ -214,13 +214,13 @@ class OrchestratorService:
 
     # STEP 4 – Approve section (with optional manual edit)
 
-    def approve_section(
+    async def approve_section(
         self,
         session_id: str,
         section_id: str,
         edited_content: str | None = None,
     ) -> dict:
-        section_doc = self.db.doc_sections.find_one(
+        section_doc = await self.db.doc_sections.find_one(
             {"session_id": session_id, "section_id": section_id}
         )
         if not section_doc:
@@ -230,15 +230,15 @@ class OrchestratorService:
         if edited_content is not None:
             update_fields["content"] = edited_content.strip()
 
-        self.db.doc_sections.update_one(
+        await self.db.doc_sections.update_one(
             {"_id": section_doc["_id"]}, {"$set": update_fields}
         )
 
-        session = self.db.doc_sessions.find_one({"_id": session_id})
+        session = await self.db.doc_sessions.find_one({"_id": session_id})
         new_index = session["current_section_index"] + 1
         all_done = new_index >= session["total_sections"]
 
-        self.db.doc_sessions.update_one(
+        await self.db.doc_sessions.update_one(
             {"_id": session_id},
             {
                 "$set": {
@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import multiprocessing
+import textwrap
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+from fastapi import HTTPException
+from fpdf import FPDF
+
+from app.config import settings
+from app.services.markdown_blocks import plain
+
+logger = logging.getLogger("docforge.pdf")
+
+
+class PDFTooLarge(Exception):
+    """Rendering stopped at the max-pages guard."""
+
+
+class PDFRenderTimeout(Exception):
+    """Rendering passed its deadline."""
+
+
+# ─── Layout ───────────────────────────────────────────────────
+# heading level -> (space before, font size, line height, space after)
+_HEADING_STYLE = {1: (6, 18, 10, 4), 2: (4, 14, 8, 2), 3: (3, 12, 7, 1)}
+
+class DocForgePDF(FPDF):
+    doc_title: str = "Document"
+
+    def header(self):
+        self.set_font("Helvetica", "B", 9)
+        self.set_text_color(160, 160, 160)
+        self.cell(0, 8, f"DocForge  |  {self.doc_title}", align="R")
+        self.ln(8)
+        self.set_text_color(0, 0, 0)
+
+def clean(text: str) -> str:
+    """Replace known unicode chars and strip anything outside latin-1 range."""
+    replacements = {
+        "•": "-",   # bullet •
+        "–": "-",   # en dash
+        "—": "-",   # em dash
+        "‘": "'",   # left single quote
+        "’": "'",   # right single quote
+        "“": '"',   # left double quote
+        "”": '"',   # right double quote
+        "₹": "Rs.", # rupee sign ₹
+        "…": "...", # ellipsis
+        " ": " ",   # non-breaking space
+        "**": "",        # strip markdown bold markers
+        "__": "",        # strip markdown underline markers
+    }
+    for char, replacement in replacements.items():
+        text = text.replace(char, replacement)
+    # Final safety net: drop anything still outside latin-1
+    return text.encode("latin-1", errors="ignore").decode("latin-1")
+
+@lru_cache(maxsize=None)
+def _wrapper(width: int) -> textwrap.TextWrapper:
+    return textwrap.TextWrapper(width=width, break_long_words=True, replace_whitespace=False)
+
+def safe_multicell(pdf, text, line_height=7, width=95):
+    """
+    Prevents FPDFException: Not enough horizontal space to render a single character.
+    `text` must already be clean() — render_blocks_to_pdf cleans each block once.
+    """
+    pdf.set_x(pdf.l_margin)
+    pdf.multi_cell(0, line_height, "\n".join(_wrapper(width).wrap(text)))
+
+def render_blocks_to_pdf(blocks: list, doc_title: str = "Document",
+                         max_pages: int | None = None, deadline: float | None = None) -> bytes:
+    """
+    Lay out a markdown block AST (services/markdown_blocks.py) as a PDF.
+    Raises PDFTooLarge past `max_pages` and PDFRenderTimeout once
+    time.monotonic() passes `deadline`.
+    """
+    pdf = DocForgePDF()
+    pdf.doc_title = doc_title = clean(doc_title)
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+
+    # ── Title block on first page ──────────────────────────────
+    pdf.set_font("Helvetica", "B", 24)
+    pdf.set_text_color(15, 32, 68)   # dark navy
+    safe_multicell(pdf, doc_title, 12, 90)
+    pdf.ln(3)
+    pdf.set_draw_color(79, 110, 247)  # accent blue
+    pdf.set_line_width(0.8)
+    pdf.line(pdf.l_margin, pdf.get_y(), pdf.l_margin + 60, pdf.get_y())
+    pdf.set_line_width(0.2)
+    pdf.set_draw_color(0, 0, 0)
+    pdf.set_text_color(0, 0, 0)
+    pdf.ln(8)
+
+    for block in blocks:
+        if max_pages and pdf.page_no() > max_pages:
+            raise PDFTooLarge(f"Document is longer than {max_pages} pages")
+        if deadline and time.monotonic() > deadline:
+            raise PDFRenderTimeout("PDF rendering took too long")
+
+        kind = block["type"]
+        # Clean each piece of text exactly once — strip all unicode the font can't handle
+        text = clean(plain(block["spans"])) if "spans" in block else ""
+        if kind == "heading":
+            before, size, height, after = _HEADING_STYLE[block["level"]]
+            pdf.ln(before)
+            pdf.set_font("Helvetica", "B", size)
+            safe_multicell(pdf, text, height)
+            pdf.ln(after)
+        elif kind == "divider":
+            pdf.ln(2)
+            pdf.set_draw_color(200, 200, 200)
+            pdf.line(pdf.l_margin, pdf.get_y(), 200, pdf.get_y())
+            pdf.ln(4)
+        elif kind == "table":
+            pdf.set_font("Helvetica", "", 9)
+            for row in block["rows"]:
+                col_w = 180 / max(len(row), 1)
+                for cell in row:
+                    pdf.cell(col_w, 7, clean(plain(cell))[:50], border=1)
+                pdf.ln()
+                pdf.set_x(pdf.l_margin)
+        elif kind == "bullet":
+            pdf.set_font("Helvetica", "", 11)
+            pdf.set_x(pdf.l_margin + 2)
+            safe_multicell(pdf, "- " + text, 7, 88)
+        elif kind == "numbered":
+            pdf.set_font("Helvetica", "", 11)
+            safe_multicell(pdf, f"{block['marker']} {text}")
+        elif kind == "paragraph":
+            pdf.set_font("Helvetica", "", 11)
+            safe_multicell(pdf, text, 7)
+        else:
+            pdf.ln(4)
+    if max_pages and pdf.page_no() > max_pages:
+        raise PDFTooLarge(f"Document is longer than {max_pages} pages")
+    return bytes(pdf.output())
+
+
+def _render_job(blocks: list, doc_title: str, max_pages: int, timeout: float) -> bytes:
+    """Runs inside a pool process — the deadline is checked there, so a stuck render frees its worker."""
+    return render_blocks_to_pdf(blocks, doc_title, max_pages, time.monotonic() + timeout)
+
+
+# ─── Renderer service ─────────────────────────────────────────
+class PDFRenderer:
+    """
+    fpdf2 layout on a pool of worker processes instead of the API process.
+
+    Renders run on other cores, so a 50-page handbook never stalls the event
+    loop or other requests. At most `workers` renders run at once and
+    `max_queue` more may wait; beyond that callers get 503 with Retry-After
+    instead of piling up. Each render is cut off after `timeout` seconds
+    (504) or past `max_pages` pages (413).
+    """
+
+    def __init__(self, workers: int, max_queue: int, timeout: float, max_pages: int):
+        self.workers   = workers
+        self.max_queue = max_queue
+        self.timeout   = timeout
+        self.max_pages = max_pages
+        self._pool: ProcessPoolExecutor | None = None
+        self._pending  = 0
+
+    def start(self) -> None:
+        if self._pool is not None:
+            return
+        # spawn, not fork — the API process has Mongo/Redis client threads a fork would copy mid-state
+        self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                         mp_context=multiprocessing.get_context("spawn"))
+
+    def stop(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+
+    async def render(self, blocks: list, doc_title: str) -> bytes:
+        if self._pending >= self.workers + self.max_queue:
+            raise HTTPException(status_code=503, detail="PDF renderer is busy — try again shortly",
+                                headers={"Retry-After": "5"})
+        self.start()
+        self._pending += 1
+        try:
+            future = asyncio.get_running_loop().run_in_executor(
+                self._pool, _render_job, blocks, doc_title, self.max_pages, self.timeout,
+            )
+            # Backstop only — the worker enforces the deadline itself
+            return await asyncio.wait_for(future, self.timeout + 10)
+        except PDFTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except (PDFRenderTimeout, asyncio.TimeoutError):
+            raise HTTPException(status_code=504, detail=f"PDF rendering timed out after {self.timeout:.0f}s")
+        except BrokenProcessPool:
+            logger.error("PDF worker process died — restarting the pool")
+            self.stop()
+            raise HTTPException(status_code=503, detail="PDF renderer restarted — try again",
+                                headers={"Retry-After": "1"})
+        finally:
+            self._pending -= 1
+
+    def metrics(self) -> dict:
+        return {"workers": self.workers, "pending": self._pending, "max_queue": self.max_queue}
+
+
+pdf_renderer = PDFRenderer(
+    workers=settings.pdf_workers,
+    max_queue=settings.pdf_max_queue,
+    timeout=settings.pdf_render_timeout_sec,
+    max_pages=settings.pdf_max_pages,
+)
@@ -0,0 +1,76 @@
+import hashlib
+import logging
+from datetime import datetime, timedelta
+
+from gridfs import AsyncGridFSBucket
+from gridfs.errors import NoFile
+
+from app.config import settings
+
+logger = logging.getLogger("docforge.pdf_store")
+
+PDF_BUCKET       = "pdfs"       # GridFS collections pdfs.files / pdfs.chunks
+STREAM_CHUNK     = 255 * 1024   # GridFS default chunk size — one chunk per read
+RENDERER_VERSION = 2            # bump when the PDF layout or markdown tokenizer changes so stored PDFs are re-rendered
+
+
+def pdf_hash(content: str, doc_title: str) -> str:
+    """Content hash of a compiled document — used as the stored PDF's key and the HTTP ETag."""
+    h = hashlib.sha256(f"{RENDERER_VERSION}\0{doc_title}\0".encode())
+    h.update(content.encode())
+    return h.hexdigest()
+
+
+async def store_pdf(db, session_id: str, digest: str, pdf_bytes: bytes) -> dict:
+    """
+    Save a rendered PDF to GridFS and point generated_documents.pdf at it.
+    The file it replaces stays readable for downloads already streaming it and
+    is removed by a later sweep. Returns the new `pdf` sub-document.
+    """
+    bucket  = AsyncGridFSBucket(db, bucket_name=PDF_BUCKET)
+    file_id = await bucket.upload_from_stream(
+        f"{digest}.pdf", pdf_bytes, metadata={"session_id": session_id, "hash": digest},
+    )
+    info = {"hash": digest, "file_id": file_id, "size": len(pdf_bytes), "rendered_at": datetime.utcnow()}
+
+    await db.generated_documents.update_one({"session_id": session_id}, {"$set": {"pdf": info}})
+    await sweep_pdfs(db, session_id, keep=file_id)
+    return info
+
+
+async def sweep_pdfs(db, session_id: str, keep) -> int:
+    """
+    Delete the session's PDFs other than `keep` uploaded more than
+    pdf_gc_grace_sec ago. Newer ones may still be streaming to a client.
+    """
+    bucket = AsyncGridFSBucket(db, bucket_name=PDF_BUCKET)
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.pdf_gc_grace_sec)
+    stale  = db[f"{PDF_BUCKET}.files"].find(
+        {"metadata.session_id": session_id, "_id": {"$ne": keep}, "uploadDate": {"$lt": cutoff}}, {"_id": 1},
+    )
+    deleted = 0
+    async for f in stale:
+        try:
+            await bucket.delete(f["_id"])
+            deleted += 1
+        except NoFile:
+            pass    # another process swept it first
+    if deleted:
+        logger.info(f"Swept {deleted} superseded PDF(s) for {session_id}")
+    return deleted
+
+
+async def iter_pdf(db, file_id, start: int = 0, end: int | None = None):
+    """Yield bytes start..end (inclusive) of a stored PDF in GridFS-chunk-sized pieces."""
+    stream = await AsyncGridFSBucket(db, bucket_name=PDF_BUCKET).open_download_stream(file_id)
+    try:
+        await stream.seek(start)
+        remaining = (end if end is not None else stream.length - 1) - start + 1
+        while remaining > 0:
+            data = await stream.read(min(STREAM_CHUNK, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+    finally:
+        await stream.close()
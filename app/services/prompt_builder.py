@@ -0,0 +1,84 @@
+"""
+Prompt assembly ordered for provider prompt caching.
+
+Azure OpenAI reuses the computation for the longest prompt prefix it has
+seen recently (in 128-token steps past the first 1024), so everything that
+is identical across calls must come first and byte-for-byte stable:
+
+    1. static instructions   — same for every call of a task (system message)
+    2. template-level rules  — same for every section of a template
+    3. company context       — same for every call in a session
+    4. per-call data         — the section, its Q&A, the instruction
+
+Dicts are serialised with sorted keys so equal data always renders the
+same bytes.
+"""
+import json
+from dataclasses import dataclass, field
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+
+@dataclass(frozen=True)
+class Prompt:
+    task:    str                # "questions", "section", ... — usage stats and routing are kept per task
+    system:  str                # static instructions
+    user:    str                # template rules → company context → per-call data
+    routing: dict | None = field(default=None, compare=False)   # template model_routing overrides — never sent
+
+    @property
+    def text(self) -> str:
+        """Whole prompt as one string — the LLM response cache key."""
+        return f"{self.system}\n\n{self.user}"
+
+    def messages(self) -> list:
+        return [SystemMessage(content=self.system), HumanMessage(content=self.user)]
+
+
+def dump(value) -> str:
+    """Stable JSON for prompt bodies."""
+    return json.dumps(value, indent=2, sort_keys=True, ensure_ascii=False)
+
+
+def company_block(company_context: dict | None, heading: str = "COMPANY CONTEXT") -> str:
+    if not company_context:
+        return ""
+    return f"""{heading}:
+- Company: {company_context.get('company_name', '')}
+- Product: {company_context.get('product_name', '')} — {company_context.get('product_description', '')}
+- Industry: {company_context.get('industry_vertical', '')}
+- Stage: {company_context.get('company_stage', '')}
+- Target customer: {company_context.get('target_customer', '')}
+- Key problem solved: {company_context.get('key_problem_solved', '')}"""
+
+
+def build_prompt(
+    task: str,
+    static: str,
+    template_rules: dict | None = None,
+    company_context: dict | None = None,
+    company_heading: str = "COMPANY CONTEXT",
+    data: list[tuple[str, object]] = (),
+    instruction: str = "",
+    routing: dict | None = None,
+) -> Prompt:
+    """
+    Assemble a Prompt in cache-friendly order.
+
+    `template_rules` maps a heading to a rules dict (e.g. {"GENERATION RULES": {...}}).
+    `data` is the per-call part as (heading, value) pairs; dicts and lists are
+    rendered with dump(), strings as-is. `instruction` closes the prompt.
+    `routing` is the template's model_routing block, used to pick the deployment.
+    """
+    parts = []
+    for heading, rules in (template_rules or {}).items():
+        parts.append(f"{heading}:\n{dump(rules)}")
+    context = company_block(company_context, company_heading)
+    if context:
+        parts.append(context)
+    for heading, value in data:
+        body = value if isinstance(value, str) else dump(value)
+        parts.append(f"{heading}:\n{body}")
+    if instruction:
+        parts.append(instruction)
+    return Prompt(task=task, system=static.strip(), user="\n\n".join(parts), routing=routing)
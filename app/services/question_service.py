@@ -1,58 +1,73 @@
-import json
-import re
-from app.services.llm_provider import LLMProvider
+import asyncio
+import logging
 
+from app.config import settings
+from app.services.llm_provider import LLMProvider, get_llm_provider
+from app.services.json_salvage import FAILED, OK, REPAIRED, salvage_json
+from app.services.llm_cache import llm_cache
+from app.services.llm_usage import llm_usage
+from app.services.prompt_builder import build_prompt
 
-def extract_questions_from_llm(raw_text: str):
-    try:
-        match = re.search(r'\{.*\}', raw_text, re.S)
-        if not match:
-            print("No JSON found in LLM response")
-            return []
-        json_str = match.group()
-        data = json.loads(json_str)
-        return data.get("questions", [])
-    except Exception as e:
-        print("JSON parsing error:", e)
+logger = logging.getLogger("docforge.questions")
+
+
+def _valid_questions(questions) -> list:
+    """Question entries that made it out whole — a truncated tail can leave one without its text."""
+    if not isinstance(questions, list):
         return []
+    return [q for q in questions if isinstance(q, dict) and str(q.get("question_text", "")).strip()]
 
 
-class QuestionService:
-    def __init__(self):
-        self.llm = LLMProvider()
+def parse_questions(raw_text: str) -> tuple[list, str]:
+    """Questions from a single-section response and the parse outcome (ok / repaired / failed)."""
+    data, outcome = salvage_json(raw_text, key="questions")
+    questions = _valid_questions(data.get("questions")) if data else []
+    if not questions:
+        logger.warning("No usable JSON in LLM response")
+        return [], FAILED
+    return questions, outcome
 
-    async def generate_questions(self, section_json: dict, company_context: dict = None) -> list:
 
-        # Build context block from what we already know
-        known_info = ""
-        if company_context:
-            known_info = f"""
-ALREADY KNOWN — DO NOT ask about any of these:
-- Company name: {company_context.get('company_name', '')}
-- Product name: {company_context.get('product_name', '')}
-- Product description: {company_context.get('product_description', '')}
-- Industry: {company_context.get('industry_vertical', '')}
-- Company stage: {company_context.get('company_stage', '')}
-- Target customer: {company_context.get('target_customer', '')}
-- Key problem solved: {company_context.get('key_problem_solved', '')}
-"""
-
-        prompt = f"""You are helping draft one section of a business document. Your job is to ask the user ONLY what you need to write this section well.
-
-SECTION TO DRAFT:
-{json.dumps(section_json, indent=2)}
-{known_info}
-RULES:
-1. Read the section title and prompt_hint carefully to understand what this section is ABOUT
+def extract_questions_from_llm(raw_text: str):
+    return parse_questions(raw_text)[0]
+
+
+def extract_batch_from_llm(raw_text: str, section_ids: list) -> dict:
+    """Questions keyed by section id from a batched response — sections missing or empty are left out."""
+    data, _ = salvage_json(raw_text, key="sections")
+    if not data:
+        logger.warning(f"No usable JSON in batched LLM response for sections {section_ids}")
+        return {}
+
+    found = {}
+    for entry in data.get("sections", []) if isinstance(data.get("sections"), list) else []:
+        if not isinstance(entry, dict):
+            continue
+        sid, questions = entry.get("section_id"), _valid_questions(entry.get("questions"))
+        if sid in section_ids and questions:
+            found[sid] = questions
+    return found
+
+
+KNOWN_HEADING = "ALREADY KNOWN — DO NOT ask about any of these"
+
+QUESTION_RULES = """1. Read the section title and prompt_hint carefully to understand what this section is ABOUT
 2. Ask ONLY about content that belongs in THIS section of THIS document
    - "Candidate Details" in an offer letter → ask about the candidate's name, role, start date, location — NOT about technology, systems, or products
    - "Compensation" in an offer letter → ask about salary, bonuses, equity, pay frequency
    - "Scope of Work" in a contract → ask about deliverables, timelines, exclusions
-3. NEVER ask about the company product, technology stack, or business model — that is already known above
+3. NEVER ask about the company product, technology stack, or business model — that is already known (see ALREADY KNOWN)
 4. NEVER ask generic questions like "are there any compliance requirements" or "what format should be used"
 5. If the section likely needs a TABLE (e.g. compensation breakdown, fee schedule, pricing), ask for the specific numbers/rows needed for that table
 6. Ask the MINIMUM questions needed — aim for 2-3, max 5 only if the section is genuinely complex
-7. Each question must be direct and specific — answerable in 1-3 sentences
+7. Each question must be direct and specific — answerable in 1-3 sentences"""
+
+# ─── Static instructions ──────────────────────────────────────
+# Kept first and byte-identical across calls so Azure's prompt cache can reuse them.
+QUESTION_INSTRUCTIONS = f"""You are helping draft one section of a business document. Your job is to ask the user ONLY what you need to write this section well.
+
+RULES:
+{QUESTION_RULES}
 
 Return ONLY this JSON:
 {{
@@ -62,8 +77,114 @@ Return ONLY this JSON:
   ]
 }}"""
 
-        response = await self.llm.generate(prompt)
-        print("LLM RAW RESPONSE:", response)
-        questions = extract_questions_from_llm(response)
-        print("EXTRACTED QUESTIONS:", questions)
-        return questions
\ No newline at end of file
+BATCH_INSTRUCTIONS = f"""You are helping draft several sections of one business document. For EACH section given, ask the user ONLY what you need to write that section well.
+
+RULES (apply to every section separately):
+{QUESTION_RULES}
+8. Never ask the same thing for two sections — each question belongs to the one section it serves
+
+Return ONLY this JSON, with exactly one entry for each section_id listed at the end:
+{{
+  "sections": [
+    {{
+      "section_id": "...",
+      "questions": [
+        {{"question_id": "q1", "question_text": "..."}},
+        {{"question_id": "q2", "question_text": "..."}}
+      ]
+    }}
+  ]
+}}"""
+
+
+class QuestionService:
+    def __init__(self, llm: LLMProvider | None = None, routing: dict | None = None):
+        self.llm     = llm or get_llm_provider()
+        self.routing = routing   # the template's generation_rules.model_routing, if any
+
+    async def generate_questions(self, section_json: dict, company_context: dict = None) -> list:
+
+        prompt = build_prompt(
+            "questions",
+            QUESTION_INSTRUCTIONS,
+            company_context=company_context,
+            company_heading=KNOWN_HEADING,
+            data=[("SECTION TO DRAFT", section_json)],
+            routing=self.routing,
+        )
+
+        # Identical prompt + model settings → reuse the earlier response
+        route  = self.llm.route(prompt)
+        cached = await llm_cache.aget(prompt.text, route, json_mode=True)
+        if cached is not None:
+            questions = extract_questions_from_llm(cached)
+            if questions:
+                logger.debug(f"LLM cache hit for section {section_json.get('id')}: {len(questions)} questions")
+                return questions
+
+        response = await self.llm.generate(prompt, json_mode=True)
+        logger.debug(f"LLM raw response for section {section_json.get('id')}: {response}")
+        questions, outcome = parse_questions(response)
+        await llm_usage.arecord_parse(prompt.task, outcome)
+        logger.debug(f"Extracted {len(questions)} questions for section {section_json.get('id')} ({outcome})")
+
+        # Only cache responses that parsed whole — never replay a bad or truncated one
+        if outcome == OK:
+            await llm_cache.aset(prompt.text, route, json_mode=True, response=response)
+        return questions
+
+    async def _generate_batch(self, sections: list, company_context: dict | None) -> dict:
+        """One LLM call for a chunk of sections. Returns whatever parsed — possibly incomplete."""
+        if len(sections) == 1:
+            # Nothing to share — the single-section prompt (and its cache entries) fit better
+            return {sections[0]["id"]: await self.generate_questions(sections[0], company_context)}
+        ids = [s["id"] for s in sections]
+        prompt = build_prompt(
+            "questions_batch",
+            BATCH_INSTRUCTIONS,
+            company_context=company_context,
+            company_heading=KNOWN_HEADING,
+            data=[("SECTIONS TO DRAFT", sections)],
+            instruction=f"section_ids: {', '.join(ids)}",
+            routing=self.routing,
+        )
+
+        route  = self.llm.route(prompt)
+        cached = await llm_cache.aget(prompt.text, route, json_mode=True)
+        if cached is not None:
+            found = extract_batch_from_llm(cached, ids)
+            if len(found) == len(ids):
+                return found
+
+        response = await self.llm.generate(prompt, json_mode=True)
+        found = extract_batch_from_llm(response, ids)
+        await llm_usage.arecord_parse(prompt.task, OK if len(found) == len(ids) else REPAIRED if found else FAILED)
+        logger.info(f"Batched questions: {len(found)}/{len(ids)} sections parsed")
+
+        # Only complete answers are cached — a partial one would force the fallback on every replay
+        if len(found) == len(ids):
+            await llm_cache.aset(prompt.text, route, json_mode=True, response=response)
+        return found
+
+    async def generate_questions_batch(self, sections: list, company_context: dict = None,
+                                       batch_size: int | None = None) -> dict:
+        """
+        Questions for many sections, keyed by section id.
+
+        Sections are sent `batch_size` at a time (question_batch_size by default),
+        so the company context and rules are sent once per chunk instead of once
+        per section. Any section a chunk's JSON leaves out or empty falls back to
+        its own generate_questions() call.
+        """
+        batch_size = batch_size or settings.question_batch_size
+        chunks = [sections[i : i + batch_size] for i in range(0, len(sections), batch_size)]
+        found  = {}
+        for result in await asyncio.gather(*(self._generate_batch(c, company_context) for c in chunks)):
+            found.update(result)
+
+        missing = [s for s in sections if s["id"] not in found]
+        if missing:
+            logger.info(f"Batch fallback — per-section calls for: {[s['id'] for s in missing]}")
+            singles = await asyncio.gather(*(self.generate_questions(s, company_context) for s in missing))
+            found.update({s["id"]: q for s, q in zip(missing, singles)})
+        return found
@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import threading
+import time
+
+from app.config import settings
+from app.redis_client import STATE_PREFIX, get_redis
+
+logger = logging.getLogger("docforge.rate_limiter")
+
+# Token bucket shared by every worker. Uses Redis server time so worker clocks never matter.
+# KEYS[1] bucket hash, KEYS[2] blocked-until (ms). ARGV[1] rate/s, ARGV[2] capacity.
+# Returns 0 when a token was taken, otherwise the milliseconds to wait before retrying.
+_ACQUIRE_LUA = """
+local t   = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local blocked = tonumber(redis.call('GET', KEYS[2]) or '0')
+if blocked > now then
+    return blocked - now
+end
+
+local rate = tonumber(ARGV[1])
+local cap  = tonumber(ARGV[2])
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or cap
+local ts     = tonumber(data[2]) or now
+tokens = math.min(cap, tokens + (now - ts) * rate / 1000)
+
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], 60000)
+return wait
+"""
+
+# Pushes blocked-until forward (never backward) after a 429 with Retry-After.
+_BLOCK_LUA = """
+local t   = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local until_ms = now + tonumber(ARGV[1])
+local current  = tonumber(redis.call('GET', KEYS[1]) or '0')
+if until_ms > current then
+    redis.call('SET', KEYS[1], until_ms, 'PX', tonumber(ARGV[1]) + 1000)
+end
+return until_ms
+"""
+
+
+class DistributedTokenBucket:
+    """
+    Request pacing shared by every uvicorn worker through Redis.
+
+    `acquire()` blocks until a token is available, so N workers together stay
+    within `rate` requests/second instead of N × rate. When the upstream API
+    answers 429, `block_for(retry_after)` pauses every worker until the
+    Retry-After deadline. Falls back to an in-process bucket when Redis is
+    unavailable — pacing is then per worker only.
+    """
+
+    def __init__(self, name: str, rate: float, capacity: int):
+        self.rate     = rate
+        self.capacity = capacity
+        prefix = f"{STATE_PREFIX}ratelimit:{name}"
+        self._bucket_key  = f"{prefix}:bucket"
+        self._blocked_key = f"{prefix}:blocked_until"
+        self._waiting_key = f"{prefix}:waiting"
+        self._stats_key   = f"{prefix}:stats"
+
+        self._acquire_script = None
+        self._block_script   = None
+
+        # In-process fallback state
+        self._lock          = threading.Lock()
+        self._local_tokens  = float(capacity)
+        self._local_ts      = time.monotonic()
+        self._local_blocked = 0.0
+        self._local_waiting = 0
+
+    # ── Token acquisition ────────────────────────────────────
+    def _try_local(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            if self._local_blocked > now:
+                return self._local_blocked - now
+            self._local_tokens = min(self.capacity, self._local_tokens + (now - self._local_ts) * self.rate)
+            self._local_ts = now
+            if self._local_tokens >= 1:
+                self._local_tokens -= 1
+                return 0.0
+            return (1 - self._local_tokens) / self.rate
+
+    def _try_acquire(self, r) -> float:
+        """Seconds to wait before trying again; 0 means a token was taken."""
+        if r is None:
+            return self._try_local()
+        try:
+            if self._acquire_script is None:
+                self._acquire_script = r.register_script(_ACQUIRE_LUA)
+            wait_ms = self._acquire_script(keys=[self._bucket_key, self._blocked_key],
+                                           args=[self.rate, self.capacity])
+            return int(wait_ms) / 1000
+        except Exception as e:
+            logger.warning(f"Rate limiter Redis error — pacing locally: {e}")
+            return self._try_local()
+
+    def _enter(self, r) -> None:
+        with self._lock:
+            self._local_waiting += 1
+        if r is not None:
+            try: r.incr(self._waiting_key)
+            except Exception: pass
+
+    def _leave(self, r, waited: float) -> None:
+        with self._lock:
+            self._local_waiting -= 1
+        if r is not None:
+            try:
+                pipe = r.pipeline(transaction=False)
+                pipe.decr(self._waiting_key)
+                pipe.hincrby(self._stats_key, "acquired", 1)
+                pipe.hincrbyfloat(self._stats_key, "wait_sec_total", round(waited, 4))
+                pipe.execute()
+            except Exception:
+                pass
+
+    def acquire(self) -> float:
+        """Block until a token is available. Returns seconds spent waiting."""
+        r = get_redis()
+        self._enter(r)
+        started = time.monotonic()
+        try:
+            while True:
+                wait = self._try_acquire(r)
+                if wait <= 0:
+                    break
+                time.sleep(wait)
+        finally:
+            waited = time.monotonic() - started
+            self._leave(r, waited)
+        return waited
+
+    @staticmethod
+    async def _off_loop(r, fn, *args):
+        # Round trips on the sync Redis client run in a thread so they never stall the event loop
+        if r is None:
+            return fn(*args)
+        return await asyncio.to_thread(fn, *args)
+
+    async def acquire_async(self) -> float:
+        """acquire() for async callers — Redis calls run off the event loop, waits use asyncio.sleep."""
+        r = get_redis()
+        await self._off_loop(r, self._enter, r)
+        started = time.monotonic()
+        try:
+            while True:
+                wait = await self._off_loop(r, self._try_acquire, r)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+        finally:
+            waited = time.monotonic() - started
+            await self._off_loop(r, self._leave, r, waited)
+        return waited
+
+    # ── Back-pressure from the upstream API ──────────────────
+    def block_for(self, seconds: float) -> None:
+        """Stop every worker from acquiring for `seconds` (e.g. a 429 Retry-After)."""
+        with self._lock:
+            self._local_blocked = max(self._local_blocked, time.monotonic() + seconds)
+        r = get_redis()
+        if r is None:
+            return
+        try:
+            if self._block_script is None:
+                self._block_script = r.register_script(_BLOCK_LUA)
+            self._block_script(keys=[self._blocked_key], args=[int(seconds * 1000)])
+            r.hincrby(self._stats_key, "throttled", 1)
+        except Exception as e:
+            logger.warning(f"Rate limiter could not share Retry-After: {e}")
+
+    async def block_for_async(self, seconds: float) -> None:
+        """block_for() for async callers."""
+        await self._off_loop(get_redis(), self.block_for, seconds)
+
+    # ── Metrics ──────────────────────────────────────────────
+    def metrics(self) -> dict:
+        base = {
+            "rate_per_sec":         self.rate,
+            "burst":                self.capacity,
+            "local_waiting":        self._local_waiting,
+        }
+        r = get_redis()
+        if r is None:
+            return {**base, "backend": "local"}
+        try:
+            pipe = r.pipeline(transaction=False)
+            pipe.get(self._waiting_key)
+            pipe.hgetall(self._stats_key)
+            pipe.pttl(self._blocked_key)
+            waiting, stats, blocked_ms = pipe.execute()
+            acquired = int(stats.get("acquired", 0))
+            wait_sum = float(stats.get("wait_sec_total", 0))
+            return {
+                **base,
+                "backend":          "redis",
+                "queue_depth":      max(int(waiting or 0), 0),
+                "acquired":         acquired,
+                "throttled_429":    int(stats.get("throttled", 0)),
+                "avg_wait_sec":     round(wait_sum / acquired, 4) if acquired else 0.0,
+                "blocked_for_sec":  round(blocked_ms / 1000, 3) if blocked_ms and blocked_ms > 0 else 0.0,
+            }
+        except Exception as e:
+            return {**base, "backend": "error", "detail": str(e)}
+
+
+notion_rate_limiter = DistributedTokenBucket(
+    "notion",
+    rate=settings.notion_rate_per_sec,
+    capacity=settings.notion_rate_burst,
+)
@@ -1,46 +1,13 @@
-import json
-from app.services.llm_provider import LLMProvider
+from typing import AsyncIterator
 
+from app.services.llm_provider import LLMProvider, get_llm_provider
+from app.services.llm_routing import split_routing
+from app.services.prompt_builder import Prompt, build_prompt
 
-class SectionService:
-    def __init__(self):
-        self.llm = LLMProvider()
-
-    async def generate_section(
-        self,
-        section_json: dict,
-        qa_pairs: list,
-        generation_rules: dict,
-        terminology_rules: dict
-    ) -> str:
-
-        company_context = generation_rules.pop("company_context", {})
-
-        context_block = ""
-        if company_context:
-            context_block = f"""
-COMPANY CONTEXT:
-- Company: {company_context.get('company_name', '')}
-- Product: {company_context.get('product_name', '')} — {company_context.get('product_description', '')}
-- Industry: {company_context.get('industry_vertical', '')}
-- Stage: {company_context.get('company_stage', '')}
-- Target customer: {company_context.get('target_customer', '')}
-- Key problem solved: {company_context.get('key_problem_solved', '')}
-"""
-
-        prompt = f"""You are an expert document writer. Write the section below using ONLY the information provided.
 
-SECTION:
-{json.dumps(section_json, indent=2)}
-{context_block}
-USER Q&A:
-{json.dumps(qa_pairs, indent=2)}
-
-GENERATION RULES:
-{json.dumps(generation_rules, indent=2)}
-
-TERMINOLOGY RULES:
-{json.dumps(terminology_rules, indent=2)}
+# ─── Static instructions ──────────────────────────────────────
+# Kept first and byte-identical across calls so Azure's prompt cache can reuse them.
+SECTION_INSTRUCTIONS = """You are an expert document writer. Write the section described at the end using ONLY the information provided.
 
 OUTPUT FORMAT RULES — STRICTLY FOLLOW:
 1. Output in clean Markdown
@@ -55,44 +22,9 @@ OUTPUT FORMAT RULES — STRICTLY FOLLOW:
 4. Use bullet lists where items are enumerable
 5. Do NOT use HTML tags
 6. Do NOT add a heading — the section title is already shown above
-7. Write ONLY the section content, nothing else
-
-Write this section now:"""
-
-        return await self.llm.generate(prompt)
-
-    async def enhance_section(
-        self,
-        section_json: dict,
-        current_content: str,
-        enhance_prompt: str,
-        company_context: dict,
-        generation_rules: dict,
-    ) -> str:
-        context_block = ""
-        if company_context:
-            context_block = f"""
-COMPANY CONTEXT:
-- Company: {company_context.get('company_name', '')}
-- Product: {company_context.get('product_name', '')} — {company_context.get('product_description', '')}
-- Industry: {company_context.get('industry_vertical', '')}
-- Stage: {company_context.get('company_stage', '')}
-- Target customer: {company_context.get('target_customer', '')}
-"""
-
-        prompt = f"""You are an expert document writer enhancing an existing section based on a user's instruction.
-
-SECTION METADATA:
-{json.dumps(section_json, indent=2)}
-{context_block}
-CURRENT CONTENT:
-{current_content}
-
-GENERATION RULES:
-{json.dumps(generation_rules, indent=2)}
+7. Write ONLY the section content, nothing else"""
 
-USER ENHANCEMENT INSTRUCTION:
-{enhance_prompt}
+ENHANCE_INSTRUCTIONS = """You are an expert document writer enhancing an existing section based on a user's instruction.
 
 YOUR TASK:
 - Rewrite and enhance the section following the user's instruction EXACTLY
@@ -107,8 +39,85 @@ OUTPUT FORMAT RULES — STRICTLY FOLLOW:
 4. Use bullet lists where items are enumerable
 5. Do NOT use HTML tags
 6. Do NOT add a heading — section title is already shown above
-7. Write ONLY the enhanced section content
+7. Write ONLY the enhanced section content"""
 
-Enhanced section:"""
 
-        return await self.llm.generate(prompt)
\ No newline at end of file
+class SectionService:
+    def __init__(self, llm: LLMProvider | None = None):
+        self.llm = llm or get_llm_provider()
+
+    async def generate_section(
+        self,
+        section_json: dict,
+        qa_pairs: list,
+        generation_rules: dict,
+        terminology_rules: dict,
+        company_context: dict | None = None,
+    ) -> str:
+        prompt = self._section_prompt(section_json, qa_pairs, generation_rules, terminology_rules, company_context)
+        return await self.llm.generate(prompt)
+
+    async def stream_section(
+        self,
+        section_json: dict,
+        qa_pairs: list,
+        generation_rules: dict,
+        terminology_rules: dict,
+        company_context: dict | None = None,
+    ) -> AsyncIterator[str]:
+        """Same prompt as generate_section, but yields tokens as they arrive."""
+        prompt = self._section_prompt(section_json, qa_pairs, generation_rules, terminology_rules, company_context)
+        async for token in self.llm.stream(prompt):
+            yield token
+
+    @staticmethod
+    def _section_prompt(
+        section_json: dict,
+        qa_pairs: list,
+        generation_rules: dict,
+        terminology_rules: dict,
+        company_context: dict | None = None,
+    ) -> Prompt:
+        """
+        Static instructions → template rules → company context → this section.
+        Callers may still pass company_context inside generation_rules; it is
+        split out so the template rules stay identical across sessions, and
+        the template's model_routing block only picks the deployment.
+        """
+        generation_rules, routing = split_routing(dict(generation_rules))
+        rules_context    = generation_rules.pop("company_context", None)
+        company_context  = company_context or rules_context
+
+        return build_prompt(
+            "section",
+            SECTION_INSTRUCTIONS,
+            template_rules={"GENERATION RULES": generation_rules, "TERMINOLOGY RULES": terminology_rules},
+            company_context=company_context,
+            data=[("SECTION", section_json), ("USER Q&A", qa_pairs)],
+            instruction="Write this section now:",
+            routing=routing,
+        )
+
+    async def enhance_section(
+        self,
+        section_json: dict,
+        current_content: str,
+        enhance_prompt: str,
+        company_context: dict,
+        generation_rules: dict,
+    ) -> str:
+        generation_rules, routing = split_routing(generation_rules)
+        prompt = build_prompt(
+            "enhance",
+            ENHANCE_INSTRUCTIONS,
+            template_rules={"GENERATION RULES": generation_rules},
+            company_context=company_context,
+            data=[
+                ("SECTION METADATA", section_json),
+                ("CURRENT CONTENT", current_content),
+                ("USER ENHANCEMENT INSTRUCTION", enhance_prompt),
+            ],
+            instruction="Enhanced section:",
+            routing=routing,
+        )
+        return await self.llm.generate(prompt)
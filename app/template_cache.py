@@ -0,0 +1,97 @@
+import logging
+from dataclasses import dataclass
+
+from app.config import settings
+from app.redis_client import LocalCache
+
+logger = logging.getLogger("docforge.template_cache")
+
+# Fields that identify a template revision — a cheap projection compared before reusing an entry.
+# Edits that bump neither field are picked up after template_cache_ttl_sec or on /cache/bust.
+VERSION_PROJECTION = {"version": 1, "updated_at": 1}
+
+
+@dataclass(frozen=True)
+class CachedTemplate:
+    """
+    A template document plus the lookups every session endpoint needs.
+
+    Shared between requests — treat every dict in here as read-only and copy
+    before modifying (see _section_rules in routes/sessions.py).
+    """
+    template:       dict
+    fingerprint:    tuple
+    sections_by_id: dict
+    section_order:  list
+
+    @property
+    def template_json(self) -> dict:
+        return self.template["template_json"]
+
+    @property
+    def sections(self) -> list:
+        return self.template["template_json"]["sections"]
+
+    def section(self, section_id: str) -> dict | None:
+        return self.sections_by_id.get(section_id)
+
+    @property
+    def model_routing(self) -> dict | None:
+        """Per-template LLM route overrides (generation_rules.model_routing) — see services/llm_routing.py."""
+        routing = self.template_json.get("generation_rules", {}).get("model_routing")
+        return routing if isinstance(routing, dict) else None
+
+
+def _fingerprint(doc: dict) -> tuple:
+    return (doc.get("version"), doc.get("updated_at"))
+
+
+def _build(doc: dict) -> CachedTemplate:
+    sections = doc["template_json"]["sections"]
+    return CachedTemplate(
+        template=doc,
+        fingerprint=_fingerprint(doc),
+        sections_by_id={s["id"]: s for s in sections},
+        section_order=[s["id"] for s in sections],
+    )
+
+
+_cache = LocalCache(maxsize=settings.template_cache_max_entries, ttl=settings.template_cache_ttl_sec)
+
+
+def get_template(db, template_id: str) -> CachedTemplate | None:
+    """Sync lookup for def routes. Only the version fields are read when the cached copy is current."""
+    probe = db.document_templates.find_one({"_id": template_id}, VERSION_PROJECTION)
+    if not probe:
+        _cache.delete(template_id)
+        return None
+
+    cached = _cache.get(template_id)
+    if cached is not None and cached.fingerprint == _fingerprint(probe):
+        return cached
+
+    doc = db.document_templates.find_one({"_id": template_id})
+    if not doc:
+        return None
+    entry = _build(doc)
+    _cache.set(template_id, entry)
+    return entry
+
+
+async def aget_template(db, template_id: str) -> CachedTemplate | None:
+    """Async twin of get_template for routes on the async Mongo handle."""
+    probe = await db.document_templates.find_one({"_id": template_id}, VERSION_PROJECTION)
+    if not probe:
+        _cache.delete(template_id)
+        return None
+
+    cached = _cache.get(template_id)
+    if cached is not None and cached.fingerprint == _fingerprint(probe):
+        return cached
+
+    doc = await db.document_templates.find_one({"_id": template_id})
+    if not doc:
+        return None
+    entry = _build(doc)
+    _cache.set(template_id, entry)
+    return entry